@@ -0,0 +1,192 @@
+"""Бенчмарк бэкендов извлечения текста на сохранённом корпусе барных страниц.
+
+Запись корпуса (нужна сеть):
+    uv run python benchmarks/extractors.py record --topics 10
+
+Прогон по корпусу:
+    uv run python benchmarks/extractors.py run --repeat 5 --output extractors.json
+
+Каждый бэкенд меряется в отдельном процессе, чтобы пиковая память одного не влияла на другой.
+Паритет считается относительно BeautifulSoup-бэкенда: доля страниц с идентичным текстом и средняя
+похожесть по `difflib.SequenceMatcher`. К записанному корпусу всегда добавляются встроенные страницы
+`BUILTIN_PAGES` с пограничными случаями разметки.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import resource
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+from typing import Any, Final
+
+import httpx
+
+from barquiz.config import ExtractorBackend, settings
+from barquiz.core.data import TOPICS
+from barquiz.utils.extractors import EXTRACTORS, lxml_html
+from barquiz.utils.search import search_ddg
+
+DEFAULT_CORPUS: Final[Path] = Path(__file__).parent / "corpus"
+INDEX_FILE: Final[str] = "index.json"
+# Страницы (HTML, тема), которые легко разбираются по-разному: XHTML с объявлением XML и кодировки и
+# заголовок с разметкой внутри <title>, релевантный теме только по тексту вложенного тега.
+BUILTIN_PAGES: Final[tuple[tuple[str, str], ...]] = (
+    (
+        """<?xml version="1.0" encoding="windows-1251"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head><title>Коктейли на основе рома</title></head>
+<body>
+<nav>Меню сайта</nav>
+<main>
+<h1>Ром в коктейлях</h1>
+<p>Мохито появился на Кубе и сочетает белый ром, лайм, мяту и содовую.</p>
+<p>Коротко.</p>
+<ul><li>Дайкири</li><li>Пина колада</li></ul>
+</main>
+<footer>Бар у моря</footer>
+</body>
+</html>""",
+        "ром",
+    ),
+    (
+        """<!DOCTYPE html>
+<html>
+<head><title> Заметки <b>бармена</b>:  текила</title></head>
+<body>
+<article>
+<h2>Как пить текилу</h2>
+<p>Бланко пьют с солью и лаймом, а выдержанную репосадо лучше пробовать медленно и без закуски.</p>
+</article>
+</body>
+</html>""",
+        "мескаль",
+    ),
+)
+
+
+async def record_corpus(corpus: Path, topics_count: int) -> None:
+    """Скачивает страницы из поисковой выдачи по первым темам из `TOPICS` и сохраняет их на диск."""
+    corpus.mkdir(parents=True, exist_ok=True)
+    index_path = corpus / INDEX_FILE
+    index: list[dict[str, str]] = json.loads(index_path.read_text("utf-8")) if index_path.exists() else []
+    known_urls = {entry["url"] for entry in index}
+
+    async with httpx.AsyncClient(timeout=settings.FETCH_TIMEOUT, follow_redirects=True) as client:
+        for topic in TOPICS[:topics_count]:
+            try:
+                urls, _ = await search_ddg(topic)
+            except TimeoutError:
+                continue
+
+            for url in urls:
+                if url in known_urls:
+                    continue
+                try:
+                    response = await client.get(url)
+                except httpx.HTTPError:
+                    continue
+                if response.status_code != httpx.codes.OK:
+                    continue
+
+                file_name = f"{hashlib.sha1(url.encode()).hexdigest()}.html"
+                (corpus / file_name).write_text(response.text, "utf-8")
+                index.append({"file": file_name, "url": url, "topic": topic})
+                known_urls.add(url)
+
+    index_path.write_text(json.dumps(index, ensure_ascii=False, indent=2), "utf-8")
+    print(f"Corpus: {len(index)} pages in {corpus}")
+
+
+def _load_pages(corpus: Path) -> list[tuple[str, str]]:
+    index_path = corpus / INDEX_FILE
+    index = json.loads(index_path.read_text("utf-8")) if index_path.exists() else []
+    recorded = [((corpus / entry["file"]).read_text("utf-8"), entry["topic"]) for entry in index]
+    return [*recorded, *BUILTIN_PAGES]
+
+
+def _measure_backend(backend: ExtractorBackend, corpus: Path, repeat: int) -> dict[str, Any]:
+    pages = _load_pages(corpus)
+    extractor = EXTRACTORS[backend]
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    started = perf_counter()
+    outputs: list[str] = []
+    for _ in range(repeat):
+        outputs = [extractor(html).text_for(topic) for html, topic in pages]
+    elapsed_s = perf_counter() - started
+    _, peak_python_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "backend": backend.value,
+        "pages": len(pages) * repeat,
+        "seconds": elapsed_s,
+        "pages_per_s": len(pages) * repeat / elapsed_s if elapsed_s else 0.0,
+        "peak_rss_delta_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss_kb,
+        "peak_python_kb": peak_python_bytes / 1024,
+        "outputs": outputs,
+    }
+
+
+def _parity(reference: list[str], candidate: list[str]) -> dict[str, float]:
+    similarities = [SequenceMatcher(None, ref, cand, autojunk=False).ratio() for ref, cand in zip(reference, candidate)]
+    exact = sum(ref == cand for ref, cand in zip(reference, candidate))
+    return {
+        "exact_match_ratio": exact / len(reference) if reference else 1.0,
+        "mean_similarity": mean(similarities) if similarities else 1.0,
+    }
+
+
+def run_benchmark(corpus: Path, repeat: int, output: Path | None) -> None:
+    """Прогоняет все доступные бэкенды по корпусу и печатает сводку."""
+    backends = [backend for backend in ExtractorBackend if backend != ExtractorBackend.LXML or lxml_html is not None]
+    spawn = multiprocessing.get_context("spawn")
+
+    results: list[dict[str, Any]] = []
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            results.append(executor.submit(_measure_backend, backend, corpus, repeat).result())
+
+    reference = results[0]["outputs"]
+    for result in results:
+        result.update(_parity(reference, result.pop("outputs")))
+        print(
+            f"{result['backend']:>5}: {result['pages_per_s']:8.1f} pages/s, "
+            f"peak RSS +{result['peak_rss_delta_kb']:,} KB, peak Python {result['peak_python_kb']:,.0f} KB, "
+            f"exact {result['exact_match_ratio']:.1%}, similarity {result['mean_similarity']:.3f}"
+        )
+
+    if output:
+        output.write_text(json.dumps(results, indent=2), "utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="скачать корпус страниц")
+    record_parser.add_argument("--topics", type=int, default=10)
+
+    run_parser = subparsers.add_parser("run", help="прогнать бэкенды по корпусу")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", type=Path)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        asyncio.run(record_corpus(args.corpus, args.topics))
+    else:
+        run_benchmark(args.corpus, args.repeat, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""Офлайн-бенчмарк пайплайна «поиск → загрузка → извлечение → LLM» на записанных фикстурах.
+
+Запись фикстур (нужны сеть и запущенная Ollama):
+    uv run python benchmarks/pipeline.py record --topics 5
+
+Синтетические фикстуры без сети (детерминированные страницы и ответы модели по темам из `TOPICS`):
+    uv run python benchmarks/pipeline.py synth --topics 20
+
+Прогон:
+    uv run python benchmarks/pipeline.py run --target both --concurrency 1,4,16 --rounds 32 \\
+        --search-latency-ms 300 --fetch-latency-ms 150 --llm-latency-ms 2000 --output pipeline.json
+
+DuckDuckGo, HTTP и Ollama подменяются локальными заглушками, которые отдают записанные ответы с
+заданной задержкой (`--jitter` разбрасывает её равномерно в долях от базовой). Кэши контекста и
+страниц, индекс абзацев, трекер здоровья хостов и пул раундов отключаются, чтобы каждый раунд
+проходил пайплайн целиком. Цель `generator` вызывает
+`generate_round_questions` напрямую, цель `api` — `GET /questions` через ASGI-транспорт.
+
+На каждый уровень конкурентности считаются пропускная способность, p50/p95/p99 по раунду и по стадиям
+(из спанов `utils/tracing.py`), задержка event loop и пиковый RSS процесса и воркеров извлечения.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import resource
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Final
+
+import httpx
+
+from barquiz.config import settings
+from barquiz.core.data import TOPICS
+from barquiz.core.generator import generate_round_questions
+from barquiz.logging_config import configure_logging
+from barquiz.utils import http_client, ollama, search, tracing
+from barquiz.utils.search import _build_queries
+from barquiz.utils.tracing import SpanRecorder
+
+DEFAULT_FIXTURES: Final[Path] = Path(__file__).parent / "fixtures"
+INDEX_FILE: Final[str] = "index.json"
+LAG_PROBE_INTERVAL_S: Final[float] = 0.01
+STAGES: Final[tuple[str, ...]] = (
+    "request",
+    "gather_quiz_context",
+    "search_ddg",
+    "http.fetch",
+    "extract_readable_text",
+    "build_prompt",
+    "query_llm",
+)
+REPLAYED_HEADERS: Final[tuple[str, ...]] = ("content-type", "location", "etag", "last-modified")
+
+
+class Fixtures:
+    """Записанные ответы DuckDuckGo, страницы и ответы Ollama."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.topics: list[str] = []
+        self.searches: dict[str, list[str]] = {}
+        self.pages: dict[str, dict[str, Any]] = {}
+        self.llm: list[str] = []
+
+    @classmethod
+    def load(cls, root: Path) -> "Fixtures":
+        """Читает фикстуры из индекса `root/index.json`.
+
+        Args:
+            root: Каталог с фикстурами.
+
+        Returns:
+            Фикстуры с темами, поисковой выдачей, страницами и ответами модели.
+        """
+        fixtures = cls(root)
+        index = json.loads((root / INDEX_FILE).read_text("utf-8"))
+        fixtures.topics = index["topics"]
+        fixtures.searches = index["searches"]
+        fixtures.pages = index["pages"]
+        fixtures.llm = index["llm"]
+        return fixtures
+
+    def save(self) -> None:
+        """Записывает индекс фикстур в `root/index.json`; тела страниц уже лежат рядом."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        index = {"topics": self.topics, "searches": self.searches, "pages": self.pages, "llm": self.llm}
+        (self.root / INDEX_FILE).write_text(json.dumps(index, ensure_ascii=False, indent=2), "utf-8")
+
+    def add_page(self, url: str, status_code: int, headers: dict[str, str], body: bytes) -> None:
+        """Сохраняет тело страницы в отдельный файл и добавляет её ответ в индекс.
+
+        Args:
+            url: Адрес страницы.
+            status_code: HTTP-статус ответа.
+            headers: Заголовки из `REPLAYED_HEADERS`.
+            body: Тело ответа.
+        """
+        file_name = f"{hashlib.sha1(url.encode()).hexdigest()}.body"
+        (self.root / file_name).write_bytes(body)
+        self.pages[url] = {"file": file_name, "status_code": status_code, "headers": headers}
+
+    def page_body(self, url: str) -> bytes:
+        """Возвращает записанное тело страницы по её адресу."""
+        return (self.root / self.pages[url]["file"]).read_bytes()
+
+
+def search_key(query: str, enforce_snippet: bool) -> str:
+    """Ключ записанной выдачи DuckDuckGo для варианта запроса и режима фильтрации сниппетов."""
+    return f"{int(enforce_snippet)}|{query}"
+
+
+class Latency:
+    """Инжектируемая задержка заглушки с равномерным разбросом."""
+
+    def __init__(self, base_ms: float, jitter: float, rng: random.Random) -> None:
+        self.base_ms = base_ms
+        self.jitter = jitter
+        self._rng = rng
+
+    def seconds(self) -> float:
+        """Возвращает очередную задержку в секундах: базовую, разбросанную на ±`jitter` от неё."""
+        spread = self._rng.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1.0
+        return max(self.base_ms * spread, 0.0) / 1000
+
+
+# --- Запись -----------------------------------------------------------------------------------
+
+
+class _RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, fixtures: Fixtures) -> None:
+        self._fixtures = fixtures
+        self._inner = httpx.AsyncHTTPTransport(http2=settings.HTTP2_ENABLED)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._inner.handle_async_request(request)
+        body = await response.aread()
+        headers = {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}
+        self._fixtures.add_page(str(request.url), response.status_code, headers, body)
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class _RecordingOllama:
+    def __init__(self, fixtures: Fixtures, inner: Any) -> None:
+        self._fixtures = fixtures
+        self._inner = inner
+
+    async def chat(self, **kwargs: Any) -> Any:
+        kwargs.pop("stream", None)
+        response = await self._inner.chat(**kwargs)
+        self._fixtures.llm.append(response["message"]["content"])
+        return response
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+
+async def record_fixtures(root: Path, topics_count: int) -> None:
+    """Прогоняет реальный пайплайн по первым темам из `TOPICS` и записывает все внешние ответы."""
+    fixtures = Fixtures(root)
+    perform_ddg_request = search._perform_ddg_request
+
+    def recording_ddg_request(query: str, enforce_snippet: bool) -> list[str]:
+        urls = perform_ddg_request(query, enforce_snippet)
+        fixtures.searches[search_key(query, enforce_snippet)] = urls
+        return urls
+
+    settings.CONTEXT_CACHE_ENABLED = False
+    settings.PAGE_CACHE_ENABLED = False
+    settings.HOST_HEALTH_ENABLED = False
+    settings.INDEX_ENABLED = False
+    search._perform_ddg_request = recording_ddg_request
+    http_client._client = httpx.AsyncClient(
+        timeout=settings.FETCH_TIMEOUT,
+        follow_redirects=True,
+        transport=_RecordingTransport(fixtures),
+    )
+    ollama._client = _RecordingOllama(fixtures, ollama._get_client())
+    root.mkdir(parents=True, exist_ok=True)
+
+    await http_client.start_extract_executor()
+    try:
+        for topic in TOPICS[:topics_count]:
+            questions = await generate_round_questions(topic)
+            fixtures.topics.append(topic)
+            print(f"{topic}: {len(questions)} questions")
+    finally:
+        await http_client.close_extract_executor()
+        await http_client.close_http_client()
+        await ollama.close_ollama_client()
+
+    fixtures.save()
+    print(f"Fixtures: {len(fixtures.searches)} searches, {len(fixtures.pages)} pages, {len(fixtures.llm)} LLM answers")
+
+
+def synthesize_fixtures(root: Path, topics_count: int) -> None:
+    """Собирает детерминированные фикстуры без сети: по несколько страниц и ответ модели на тему."""
+    fixtures = Fixtures(root)
+    rng = random.Random(0)
+    root.mkdir(parents=True, exist_ok=True)
+
+    for topic_index, topic in enumerate(TOPICS[:topics_count]):
+        urls = [f"https://bar{topic_index}-{page}.example/{page}" for page in range(settings.SEARCH_LIMIT)]
+        for query in _build_queries(topic):
+            for enforce_snippet in (True, False):
+                fixtures.searches[search_key(query, enforce_snippet)] = urls
+
+        for url in urls:
+            paragraphs = "".join(
+                f"<p>{topic.capitalize()}: бармен рассказывает, как коктейль {rng.randint(1, 999)} "
+                f"появился в баре и почему этот напиток любят гости. {'Подробности истории. ' * 20}</p>"
+                for _ in range(12)
+            )
+            html = (
+                f"<html><head><title>{topic} — бар и коктейли</title></head>"
+                f"<body><nav>Меню</nav><article>{paragraphs}</article><footer>©</footer></body></html>"
+            )
+            fixtures.add_page(url, httpx.codes.OK, {"content-type": "text/html; charset=utf-8"}, html.encode())
+
+        questions = [{"title": f"Вопрос {number} про {topic}?", "value": f"Ответ {number}"} for number in range(10)]
+        fixtures.llm.append(json.dumps({"data": questions}, ensure_ascii=False))
+        fixtures.topics.append(topic)
+
+    fixtures.save()
+    print(f"Fixtures: {len(fixtures.topics)} topics, {len(fixtures.pages)} pages in {root}")
+
+
+# --- Заглушки ---------------------------------------------------------------------------------
+
+
+class _ReplayOllama:
+    def __init__(self, fixtures: Fixtures, latency: Latency, rng: random.Random) -> None:
+        self._answers = fixtures.llm
+        self._latency = latency
+        self._rng = rng
+
+    async def chat(self, stream: bool = False, **_: Any) -> Any:
+        content = self._rng.choice(self._answers)
+        if stream:
+            return self._stream(content)
+
+        await asyncio.sleep(self._latency.seconds())
+        return {"message": {"content": content}}
+
+    async def generate(self, **_: Any) -> dict[str, Any]:
+        return {"response": "", "load_duration": 0}
+
+    async def _stream(self, content: str) -> AsyncIterator[dict[str, Any]]:
+        chunk_size = 64
+        chunks = [content[offset : offset + chunk_size] for offset in range(0, len(content), chunk_size)]
+        delay_s = self._latency.seconds() / max(len(chunks), 1)
+        for chunk in chunks:
+            await asyncio.sleep(delay_s)
+            yield {"message": {"content": chunk}}
+
+    async def close(self) -> None:
+        return None
+
+
+def install_stand_ins(fixtures: Fixtures, args: argparse.Namespace) -> None:
+    """Подменяет DuckDuckGo, HTTP-клиент и клиент Ollama на заглушки с записанными ответами."""
+    rng = random.Random(args.seed)
+    search_delay = Latency(args.search_latency_ms, args.jitter, rng)
+    fetch_delay = Latency(args.fetch_latency_ms, args.jitter, rng)
+    llm_delay = Latency(args.llm_latency_ms, args.jitter, rng)
+
+    def replay_ddg_request(query: str, enforce_snippet: bool) -> list[str]:
+        # Вызывается в потоке через asyncio.to_thread, как и настоящий поиск.
+        time.sleep(search_delay.seconds())
+        return list(fixtures.searches.get(search_key(query, enforce_snippet), []))
+
+    async def replay_page(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(fetch_delay.seconds())
+        url = str(request.url)
+        page = fixtures.pages.get(url)
+        if page is None:
+            return httpx.Response(httpx.codes.NOT_FOUND)
+        return httpx.Response(page["status_code"], headers=page["headers"], content=fixtures.page_body(url))
+
+    search._perform_ddg_request = replay_ddg_request
+    http_client._client = httpx.AsyncClient(
+        timeout=settings.FETCH_TIMEOUT,
+        follow_redirects=True,
+        transport=httpx.MockTransport(replay_page),
+    )
+    ollama._client = _ReplayOllama(fixtures, llm_delay, rng)
+
+
+# --- Прогон -----------------------------------------------------------------------------------
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+    ordered = sorted(values)
+
+    def nearest_rank(q: float) -> float:
+        return ordered[min(max(round(q * len(ordered) + 0.5) - 1, 0), len(ordered) - 1)]
+
+    return {
+        "count": len(ordered),
+        "p50": nearest_rank(0.50),
+        "p95": nearest_rank(0.95),
+        "p99": nearest_rank(0.99),
+        "max": ordered[-1],
+    }
+
+
+async def _probe_loop_lag(samples: list[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_PROBE_INTERVAL_S
+        await asyncio.sleep(LAG_PROBE_INTERVAL_S)
+        samples.append(max(loop.time() - expected, 0.0) * 1000)
+
+
+def _round_runner(target: str, client: httpx.AsyncClient) -> Callable[[str], Awaitable[bool]]:
+    async def via_generator(topic: str) -> bool:
+        return bool(await generate_round_questions(topic))
+
+    async def via_api(topic: str) -> bool:
+        response = await client.get("/questions", params={"topic": topic})
+        return response.status_code == httpx.codes.OK
+
+    return via_api if target == "api" else via_generator
+
+
+async def run_level(
+    target: str,
+    concurrency: int,
+    rounds: int,
+    topics: list[str],
+    client: httpx.AsyncClient,
+) -> dict[str, Any]:
+    """Прогоняет `rounds` раундов с заданной конкурентностью и собирает статистику уровня."""
+    tracing.recorder = SpanRecorder(capacity=rounds * 256, path=None)
+    run_round = _round_runner(target, client)
+    semaphore = asyncio.Semaphore(concurrency)
+    round_latencies: list[float] = []
+    errors = 0
+
+    async def one_round(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = perf_counter()
+            try:
+                ok = await run_round(topics[index % len(topics)])
+            except Exception:  # noqa: BLE001
+                ok = False
+            round_latencies.append((perf_counter() - started) * 1000)
+            errors += not ok
+
+    lag_samples: list[float] = []
+    stop_probe = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop_lag(lag_samples, stop_probe))
+
+    started = perf_counter()
+    await asyncio.gather(*(one_round(index) for index in range(rounds)))
+    elapsed_s = perf_counter() - started
+
+    stop_probe.set()
+    await probe
+
+    spans = [item for trace in tracing.recorder.recent_traces(rounds * 256) for item in trace]
+    stages = {
+        stage: _percentiles([item.duration_ms for item in spans if item.name == stage and item.status == "ok"])
+        for stage in STAGES
+    }
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "rounds": rounds,
+        "errors": errors,
+        "seconds": elapsed_s,
+        "rounds_per_s": rounds / elapsed_s if elapsed_s else 0.0,
+        "round_latency_ms": _percentiles(round_latencies),
+        "stages_ms": {stage: summary for stage, summary in stages.items() if summary["count"]},
+        "loop_lag_ms": _percentiles(lag_samples),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+async def run_benchmark(fixtures: Fixtures, args: argparse.Namespace) -> dict[str, Any]:
+    """Прогоняет все цели на всех уровнях конкурентности внутри жизненного цикла приложения.
+
+    Пиковый RSS воркеров извлечения ядро отдаёт только после их завершения, поэтому перед выходом из
+    жизненного цикла приложения пул воркеров останавливается с ожиданием, а RSS снимается после этого.
+    """
+    from barquiz.api import app
+
+    settings.CONTEXT_CACHE_ENABLED = False
+    settings.PAGE_CACHE_ENABLED = False
+    settings.HOST_HEALTH_ENABLED = False
+    settings.INDEX_ENABLED = False
+    settings.POOL_ENABLED = False
+    install_stand_ins(fixtures, args)
+
+    targets = ["generator", "api"] if args.target == "both" else [args.target]
+    results: list[dict[str, Any]] = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for target in targets:
+                for concurrency in args.concurrency:
+                    result = await run_level(target, concurrency, args.rounds, fixtures.topics, client)
+                    results.append(result)
+                    print(
+                        f"{target:>9} c={concurrency:<3}: {result['rounds_per_s']:6.2f} rounds/s, "
+                        f"p50 {result['round_latency_ms']['p50']:7.0f} ms, "
+                        f"p99 {result['round_latency_ms']['p99']:7.0f} ms, "
+                        f"lag p99 {result['loop_lag_ms']['p99']:5.1f} ms, errors {result['errors']}"
+                    )
+        # Lifespan закрывает пул без ожидания, и незавершённые воркеры в RUSAGE_CHILDREN не попадают.
+        await http_client.close_extract_executor(wait=True)
+
+    return {
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+        "peak_worker_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def _concurrency_levels(value: str) -> list[int]:
+    return [int(level) for level in value.split(",") if level.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="записать фикстуры с реальной сети и Ollama")
+    record_parser.add_argument("--topics", type=int, default=5)
+
+    synth_parser = subparsers.add_parser("synth", help="сгенерировать синтетические фикстуры без сети")
+    synth_parser.add_argument("--topics", type=int, default=20)
+
+    run_parser = subparsers.add_parser("run", help="прогнать пайплайн на фикстурах")
+    run_parser.add_argument("--target", choices=("generator", "api", "both"), default="both")
+    run_parser.add_argument("--concurrency", type=_concurrency_levels, default=[1, 4, 16])
+    run_parser.add_argument("--rounds", type=int, default=32)
+    run_parser.add_argument("--search-latency-ms", type=float, default=300.0)
+    run_parser.add_argument("--fetch-latency-ms", type=float, default=150.0)
+    run_parser.add_argument("--llm-latency-ms", type=float, default=2000.0)
+    run_parser.add_argument("--jitter", type=float, default=0.2)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--log-level", default="WARNING")
+    run_parser.add_argument("--output", type=Path)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        asyncio.run(record_fixtures(args.fixtures, args.topics))
+    elif args.command == "synth":
+        synthesize_fixtures(args.fixtures, args.topics)
+    else:
+        settings.LOG_LEVEL = args.log_level
+        configure_logging()
+        report = asyncio.run(run_benchmark(Fixtures.load(args.fixtures), args))
+        print(f"Peak RSS of extraction workers: {report['peak_worker_rss_kb']:,} KB")
+        if args.output:
+            args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), "utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,264 @@
 import asyncio
+import math
+from collections.abc import AsyncIterable, AsyncIterator
+from contextlib import asynccontextmanager
 from time import perf_counter
 from uuid import uuid4
 
 import uvicorn
 import structlog
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.middleware.base import RequestResponseEndpoint
+from starlette.responses import Content
 from barquiz.config import settings
-from barquiz.core.generator import gather_quiz_context, generate_round_questions
-from barquiz.models import DataGatheringResult, QuestionsResponse
+from barquiz.core.admission import AdmissionRejectedError, admission
+from barquiz.core.generator import gather_quiz_context, stream_round_questions
+from barquiz.core.pool import round_pool
+from barquiz.models import (
+    DataGatheringResult,
+    HostHealthView,
+    PoolStatus,
+    QuestionItem,
+    QuestionsResponse,
+    RoundsRequest,
+    RoundsResponse,
+    SpanView,
+    StreamError,
+    StreamErrorCode,
+    TraceView,
+)
 from barquiz.logging_config import configure_logging
+from barquiz.utils.host_health import host_health
+from barquiz.utils.http_client import (
+    close_extract_executor,
+    close_http_client,
+    start_extract_executor,
+    start_http_client,
+)
+from barquiz.utils.metrics import registry, request_latency, requests_in_flight
+from barquiz.utils.tracing import Span, SpanStatus, activate_span, finish_span, recorder, start_span
+from barquiz.utils.ollama import (
+    OllamaOverloadedError,
+    OllamaUnavailableError,
+    close_ollama_client,
+    start_keep_warm,
+    start_ollama_client,
+    stop_keep_warm,
+)
 
 from structlog.contextvars import bind_contextvars, unbind_contextvars
 
 configure_logging()
 logger = structlog.get_logger("barquiz.api")
 
-app = FastAPI(title="BarQuiz AI Service")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await start_http_client()
+    await start_extract_executor()
+    await start_ollama_client()
+    await start_keep_warm()
+    await round_pool.start()
+    try:
+        yield
+    finally:
+        await round_pool.stop()
+        await stop_keep_warm()
+        await close_ollama_client()
+        await close_extract_executor()
+        await close_http_client()
+
+
+app = FastAPI(title="BarQuiz AI Service", lifespan=lifespan)
 
 
 @app.middleware("http")
-async def request_context(request: Request, call_next):
+async def request_context(request: Request, call_next: RequestResponseEndpoint) -> Response:
     request_id = request.headers.get("x-request-id", str(uuid4()))
     bind_contextvars(request_id=request_id, path=request.url.path, method=request.method)
     started = perf_counter()
+    requests_in_flight.inc()
+    request_span = start_span("request", path=request.url.path, method=request.method)
 
     try:
-        response = await call_next(request)
-        duration_ms = (perf_counter() - started) * 1000
-        logger.info(
-            "request.completed",
-            status_code=response.status_code,
-            duration_ms=duration_ms,
-        )
-        return response
+        with activate_span(request_span):
+            response = await call_next(request)
     except HTTPException as http_exc:
-        duration_ms = (perf_counter() - started) * 1000
+        duration_ms = _finish_request(request_span, started)
+        request_latency.observe_ms(duration_ms, path=_route_path(request), status=str(http_exc.status_code))
         logger.warning(
             "request.http_error",
             status_code=http_exc.status_code,
             duration_ms=duration_ms,
         )
+        unbind_contextvars("request_id", "path", "method")
         raise
     except Exception:
-        duration_ms = (perf_counter() - started) * 1000
+        request_span.status = SpanStatus.ERROR
+        duration_ms = _finish_request(request_span, started)
+        request_latency.observe_ms(duration_ms, path=_route_path(request), status="500")
         logger.exception("request.failed", status_code=500, duration_ms=duration_ms)
+        unbind_contextvars("request_id", "path", "method")
+        raise
+
+    # call_next возвращает ответ, как только отправлены заголовки, а тело (у /questions/stream — весь
+    # раунд) ещё генерируется. Поэтому запрос считается завершённым, когда отдано тело.
+    response.body_iterator = _complete_after_body(response.body_iterator, response, request, request_span, started)
+    return response
+
+
+async def _complete_after_body(
+    body: AsyncIterable[Content],
+    response: Response,
+    request: Request,
+    request_span: Span,
+    started: float,
+) -> AsyncIterator[Content]:
+    try:
+        async for chunk in body:
+            yield chunk
+    except asyncio.CancelledError:
+        request_span.status = SpanStatus.CANCELLED
+        raise
+    except Exception:
+        request_span.status = SpanStatus.ERROR
         raise
     finally:
+        duration_ms = _finish_request(request_span, started)
+        request_latency.observe_ms(duration_ms, path=_route_path(request), status=str(response.status_code))
+        logger.info(
+            "request.completed",
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+        )
         unbind_contextvars("request_id", "path", "method")
 
 
+def _finish_request(request_span: Span, started: float) -> float:
+    duration_ms = (perf_counter() - started) * 1000
+    requests_in_flight.dec()
+    finish_span(request_span, duration_ms)
+    return duration_ms
+
+
+def _route_path(request: Request) -> str:
+    # Шаблон маршрута вместо сырого пути, чтобы не раздувать число серий метрики.
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
 @app.get("/questions", response_model=QuestionsResponse)
-async def get_questions(topic: str = "барные факты"):
+async def get_questions(topic: str = "барные факты", profile: str | None = None) -> QuestionsResponse:
+    _ensure_profile(profile)
     try:
-        questions = await generate_round_questions(topic)
+        questions = await round_pool.get_round(topic, profile)
         if not questions:
             raise HTTPException(status_code=503, detail="Could not generate questions for the topic")
-        return {"data": questions}
+        return QuestionsResponse(data=questions)
     except HTTPException:
         raise
+    except OllamaOverloadedError as e:
+        logger.warning("questions.overloaded", error=str(e))
+        raise _overloaded(e)
     except Exception as e:
         logger.exception("Error generating questions")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.post("/rounds", response_model=RoundsResponse)
+async def create_rounds(request: RoundsRequest) -> RoundsResponse:
+    """Генерирует сразу несколько раундов: по списку тем или `count` раундов на случайные темы."""
+    topics: list[str | None] = [*request.topics] if request.topics else [None] * request.count
+    if not topics:
+        raise HTTPException(status_code=422, detail="Pass a non-empty list of topics or a positive count")
+    if len(topics) > settings.BATCH_MAX_ROUNDS:
+        raise HTTPException(status_code=422, detail=f"At most {settings.BATCH_MAX_ROUNDS} rounds per batch")
+    _ensure_profile(request.profile)
+
+    try:
+        rounds = await round_pool.get_rounds(topics, request.profile)
+    except OllamaOverloadedError as e:
+        logger.warning("rounds.overloaded", error=str(e))
+        raise _overloaded(e)
+    except Exception:
+        logger.exception("Error generating rounds")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    if not any(item.data for item in rounds):
+        raise HTTPException(status_code=503, detail="Could not generate questions for the topics")
+    return RoundsResponse(rounds=rounds)
+
+
+@app.get("/questions/stream")
+async def stream_questions(topic: str = "барные факты", profile: str | None = None) -> StreamingResponse:
+    """Отдаёт вопросы раунда в формате NDJSON: по одному `QuestionItem` на строку.
+
+    Если раунд оборвался после начала ответа, последней строкой приходит `StreamError`.
+    """
+    _ensure_profile(profile)
+    # Готовый раунд из пула не занимает слот admission control, поэтому проверка нужна только живой генерации.
+    ready = round_pool.take_ready(topic, profile)
+    if not ready:
+        try:
+            admission.ensure_capacity()
+        except OllamaOverloadedError as e:
+            logger.warning("questions.overloaded", error=str(e))
+            raise _overloaded(e)
+    return StreamingResponse(_iter_question_lines(topic, profile, ready), media_type="application/x-ndjson")
+
+
+def _ensure_profile(profile: str | None) -> None:
+    if profile is not None and profile not in settings.GENERATION_PROFILES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown generation profile {profile!r}, expected one of {sorted(settings.GENERATION_PROFILES)}",
+        )
+
+
+def _overloaded(error: OllamaOverloadedError) -> HTTPException:
+    retry_after_s = error.retry_after_s if isinstance(error, AdmissionRejectedError) else admission.retry_after_s()
+    return HTTPException(
+        status_code=503,
+        detail="Question generator is overloaded, try again later",
+        headers={"Retry-After": str(math.ceil(retry_after_s))},
+    )
+
+
+async def _iter_question_lines(
+    topic: str,
+    profile: str | None,
+    ready: list[QuestionItem] | None,
+) -> AsyncIterator[str]:
+    questions: AsyncIterator[QuestionItem] = (
+        _iter_ready(ready) if ready else stream_round_questions(topic, profile=profile)
+    )
+    try:
+        async for question in questions:
+            yield f"{question.model_dump_json()}\n"
+    except OllamaOverloadedError as e:
+        logger.warning("questions.stream_overloaded", error=str(e))
+        yield _stream_error_line(StreamErrorCode.OVERLOADED, "Question generator is overloaded, try again later")
+    except OllamaUnavailableError as e:
+        logger.warning("questions.stream_unavailable", error=str(e))
+        yield _stream_error_line(StreamErrorCode.FAILED, "Question generator is unavailable")
+    except Exception:
+        # Статус 200 уже отправлен, поэтому об ошибке клиент узнаёт только из последней строки потока.
+        logger.exception("questions.stream_failed")
+        yield _stream_error_line(StreamErrorCode.FAILED, "Internal server error")
+
+
+def _stream_error_line(code: StreamErrorCode, detail: str) -> str:
+    return f"{StreamError(error=code, detail=detail).model_dump_json()}\n"
+
+
+async def _iter_ready(questions: list[QuestionItem]) -> AsyncIterator[QuestionItem]:
+    for question in questions:
+        yield question
+
+
 @app.get("/debug/search", response_model=DataGatheringResult)
-async def debug_search(topic: str = "барные факты"):
+async def debug_search(topic: str = "барные факты") -> DataGatheringResult:
     logger.info("request.received", path="/debug/search", topic=topic)
     try:
         result, _ = await gather_quiz_context(topic)
@@ -72,7 +266,7 @@ async def debug_search(topic: str = "барные факты"):
             raise HTTPException(status_code=404, detail="No search results")
         return result
     except asyncio.TimeoutError:
-        logger.warning("debug.search_timeout", topic=topic, timeout_s=5)
+        logger.warning("debug.search_timeout", topic=topic, timeout_s=settings.SEARCH_TIMEOUT_S)
         raise HTTPException(status_code=504, detail="Search timed out")
     except HTTPException:
         raise
@@ -81,6 +275,48 @@ async def debug_search(topic: str = "барные факты"):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/pool", response_model=PoolStatus)
+async def debug_pool() -> PoolStatus:
+    return round_pool.status()
+
+
+@app.get("/debug/hosts", response_model=list[HostHealthView])
+async def debug_hosts() -> list[HostHealthView]:
+    return host_health.snapshot()
+
+
+@app.get("/debug/traces", response_model=list[TraceView])
+async def debug_traces(limit: int = 20) -> list[TraceView]:
+    traces: list[TraceView] = []
+    for spans in recorder.recent_traces(limit):
+        trace_started = spans[0].started_at
+        trace_finished = max(item.started_at + item.duration_ms / 1000 for item in spans)
+        traces.append(
+            TraceView(
+                trace_id=spans[0].trace_id,
+                duration_ms=(trace_finished - trace_started) * 1000,
+                spans=[
+                    SpanView(
+                        name=item.name,
+                        span_id=item.span_id,
+                        parent_id=item.parent_id,
+                        start_offset_ms=(item.started_at - trace_started) * 1000,
+                        duration_ms=item.duration_ms,
+                        status=item.status,
+                        attributes=item.attributes,
+                    )
+                    for item in spans
+                ],
+            )
+        )
+    return traces
+
+
 def start():
     # Keep our structlog setup; prevent uvicorn from overriding logging configuration.
     uvicorn.run(app, host="127.0.0.1", port=settings.PORT, log_config=None)
@@ -1,5 +1,30 @@
+from enum import StrEnum
+from pathlib import Path
+
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
+
+class ExtractExecutor(StrEnum):
+    PROCESS = "process"
+    THREAD = "thread"
+
+
+class ExtractorBackend(StrEnum):
+    BS4 = "bs4"
+    LXML = "lxml"
+
+
+class GenerationProfile(BaseModel):
+    """Параметры генерации раунда: модель, окно контекста, лимит ответа и бюджет текста в промпте."""
+
+    model: str | None = None  # None — OLLAMA_MODEL
+    num_ctx: int
+    num_predict: int
+    context_tokens: int  # бюджет токенов, в который упаковываются лучшие абзацы собранного контекста
+    temperature: float = 0.8
+
+
 class Settings(BaseSettings):
     # API
     HOST: str = "127.0.0.1"
@@ -8,16 +33,132 @@ class Settings(BaseSettings):
     # Ollama
     OLLAMA_HOST: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "qwen2.5:7b"
+    OLLAMA_TIMEOUT_S: float = 120.0
+    OLLAMA_MAX_CONNECTIONS: int = 4
+    OLLAMA_MAX_INFLIGHT: int = 1
+    OLLAMA_QUEUE_DEPTH: int = 4
+    OLLAMA_QUEUE_TIMEOUT_S: float = 60.0
+    OLLAMA_KEEP_ALIVE: str = "30m"  # сколько Ollama держит модель в памяти после запроса; "-1" — всегда
+    OLLAMA_WARMUP_ENABLED: bool = True
+    OLLAMA_KEEP_WARM_INTERVAL_S: float = 600.0  # 0 — без периодического пинга
+
+    # Generation profiles
+    GENERATION_PROFILE: str = "balanced"
+    GENERATION_PROFILES: dict[str, GenerationProfile] = {
+        "fast": GenerationProfile(num_ctx=4096, num_predict=1200, context_tokens=1_200),
+        "balanced": GenerationProfile(num_ctx=8192, num_predict=2000, context_tokens=2_500),
+        "quality": GenerationProfile(num_ctx=16384, num_predict=3000, context_tokens=4_500, temperature=0.7),
+    }
+
+    # Admission control
+    ADMISSION_MAX_CONCURRENCY: int = 2  # раунды в пайплайне одновременно; держать близко к OLLAMA_MAX_INFLIGHT
+    ADMISSION_QUEUE_SIZE: int = 8
+    ADMISSION_DEADLINE_S: float = 60.0
+    ADMISSION_EXPECTED_ROUND_S: float = 20.0
 
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "console"  # console | json
+
+    # Tracing
+    TRACE_ENABLED: bool = True
+    TRACE_BUFFER_SIZE: int = 5000
+    TRACE_FILE: str | None = None
     
     # Logic
     SEARCH_LIMIT: int = 10
-    FETCH_TIMEOUT: int = 5
+    SEARCH_TIMEOUT_S: float = 5.0
+    SEARCH_CONCURRENCY: int = 4
+    SEARCH_MIN_URLS: int = 3
+    SEARCH_MERGE_VARIANTS: bool = False
+    BATCH_MAX_ROUNDS: int = 10
+    CONTEXT_TARGET_CHARS: int = 16_000  # запас сырого текста, из которого упаковщик выбирает лучшие абзацы
+    FETCH_TIMEOUT: int = 5  # потолок таймаута одной страницы; для знакомых хостов он выводится из их задержек
+    FETCH_MIN_TIMEOUT_S: float = 1.0
+    FETCH_BUDGET_S: float = 4.0  # общий бюджет загрузки страниц одного раунда
+    FETCH_QUORUM_PAGES: int = 6  # сколько страниц с текстом достаточно; столько же загрузок идут параллельно
+    FETCH_HEDGE_DELAY_S: float = 1.0  # через сколько отстающая загрузка незнакомого хоста уступает слот запасному URL
+    FETCH_MAX_BYTES: int = 512_000
+    EXTRACT_EXECUTOR: ExtractExecutor = ExtractExecutor.PROCESS
+    EXTRACT_WORKERS: int = 2
+    EXTRACTOR_BACKEND: ExtractorBackend = ExtractorBackend.BS4
+
+    # HTTP client
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_S: float = 30.0
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 4
+
+    # Host health
+    HOST_HEALTH_ENABLED: bool = True
+    HOST_FAILURE_THRESHOLD: int = 3  # неудач подряд, после которых хост отключается на HOST_COOLDOWN_S
+    HOST_COOLDOWN_S: float = 300.0  # удваивается при каждом повторном размыкании
+    HOST_BLOCKLIST_AFTER_TRIPS: int = 3  # размыканий без единого успеха, после которых хост в блок-листе
+    HOST_BLOCKLIST_TTL_S: float = 86400.0
+    HOST_SLOW_MS: float = 2500.0  # хосты медленнее (по скользящему среднему) идут в конец выдачи
+    HOST_DEGRADED_ERROR_RATE: float = 0.5  # хосты с большей долей ошибок идут в конец выдачи
+
+    # Storage
+    CACHE_DIR: Path = Path.home() / ".cache" / "barquiz"  # от него считаются относительные пути кэшей и индекса
+
+    # Context cache
+    CONTEXT_CACHE_ENABLED: bool = True
+    CONTEXT_CACHE_PATH: str = "context.sqlite3"
+    CONTEXT_CACHE_TTL_S: float = 86400.0
+    CONTEXT_CACHE_STALE_S: float = 604800.0
+    CONTEXT_CACHE_MAX_ENTRIES: int = 500
+
+    # Page cache
+    PAGE_CACHE_ENABLED: bool = True
+    PAGE_CACHE_PATH: str = "pages.sqlite3"
+    PAGE_CACHE_MAX_BYTES: int = 50_000_000  # суммарный размер извлечённого текста; сверх него — LRU-вытеснение
+
+    # Paragraph index
+    INDEX_ENABLED: bool = True
+    INDEX_PATH: str = "paragraphs.sqlite3"
+    INDEX_MAX_PARAGRAPHS: int = 200_000
+    INDEX_MIN_PARAGRAPHS: int = 12  # столько подходящих абзацев в индексе — и сеть для темы не нужна
+    INDEX_MIN_TERM_COVERAGE: float = 0.6  # доля слов темы, которые должны встретиться в абзаце
+
+    # Offline snapshot
+    SNAPSHOT_PATH: str | None = None  # корпус из `python -m barquiz.core.snapshot`; относительный — от CACHE_DIR
+    OFFLINE_MODE: bool = False  # брать контекст только из кэша и снапшота, не ходя в сеть
+
+    # Round pool
+    POOL_ENABLED: bool = True
+    POOL_SIZE: int = 3
+    POOL_LOW_WATER: int = 2
+    POOL_TTL_S: float = 1800.0
+    POOL_REFILL_INTERVAL_S: float = 30.0
+    POOL_MAX_TOPICS: int = 8
+    POOL_PREWARM_TOPICS: list[str] = ["барные факты"]
     
     class Config:
         env_file = ".env"
 
+    def generation_profile(self, name: str | None = None) -> GenerationProfile:
+        """Возвращает профиль генерации с подставленной моделью по умолчанию.
+
+        Args:
+            name: Имя профиля; None — `GENERATION_PROFILE`.
+
+        Raises:
+            KeyError: Профиля с таким именем нет.
+        """
+        profile = self.GENERATION_PROFILES[name or self.GENERATION_PROFILE]
+        return profile if profile.model else profile.model_copy(update={"model": self.OLLAMA_MODEL})
+
+    def cache_path(self, path: str) -> Path:
+        """Возвращает путь к файлу кэша: относительный путь считается от `CACHE_DIR`, а не от рабочего каталога.
+
+        Args:
+            path: Путь из настроек.
+
+        Returns:
+            Абсолютный путь к файлу.
+        """
+        resolved = Path(path).expanduser()
+        return resolved if resolved.is_absolute() else self.CACHE_DIR.expanduser() / resolved
+
 settings = Settings()
@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import math
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from itertools import count
+from time import perf_counter
+from typing import Final
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.utils.metrics import admission_queue_depth, admission_rejected, admission_wait_latency
+from barquiz.utils.ollama import OllamaOverloadedError
+
+logger = structlog.get_logger(__name__)
+
+ROUND_TIME_SMOOTHING: Final[float] = 0.2
+
+
+class Priority(IntEnum):
+    """Приоритет генерации раунда: меньшее значение обслуживается раньше."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class AdmissionRejectedError(OllamaOverloadedError):
+    """Раунд не принят в работу: очередь полна или он не успеет к дедлайну."""
+
+    def __init__(self, message: str, retry_after_s: float) -> None:
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+@dataclass(order=True, slots=True)
+class _Waiter:
+    priority: Priority
+    sequence: int
+    future: asyncio.Future[None] = field(compare=False)
+
+
+class AdmissionController:
+    """Пускает в пайплайн не больше `max_concurrency` раундов, остальные ждут в очереди с приоритетами.
+
+    Очередь ограничена `queue_size`. Интерактивный запрос, пришедший в полную очередь, вытесняет
+    самый поздний фоновый; если вытеснять некого — получает отказ. Интерактивные запросы имеют дедлайн:
+    если по оценке (скользящее среднее длительности раунда × число «волн» впереди) раунд не успеет
+    завершиться вовремя, он отклоняется сразу, а не после долгого ожидания.
+    """
+
+    def __init__(self, max_concurrency: int, queue_size: int, deadline_s: float, expected_round_s: float) -> None:
+        self._max_concurrency = max_concurrency
+        self._queue_size = queue_size
+        self._deadline_s = deadline_s
+        self._round_s = expected_round_s
+        self._active = 0
+        self._queue: list[_Waiter] = []
+        self._sequence = count()
+
+    def retry_after_s(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Оценивает, через сколько секунд стоит повторить запрос с таким приоритетом."""
+        return max(self._estimated_wait_s(priority), 1.0)
+
+    def ensure_capacity(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        """Проверяет, что раунд с таким приоритетом будет принят прямо сейчас.
+
+        Raises:
+            AdmissionRejectedError: Очередь полна или раунд не успеет к дедлайну.
+        """
+        if self._active < self._max_concurrency and not self._queue:
+            return
+
+        if len(self._queue) >= self._queue_size and self._evictable(priority) is None:
+            self._reject(priority, "queue_full")
+
+        deadline_s = self._deadline_for(priority)
+        if deadline_s is not None and self._estimated_wait_s(priority) + self._round_s > deadline_s:
+            self._reject(priority, "deadline")
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE, rounds: int = 1) -> AsyncIterator[None]:
+        """Занимает место в пайплайне на время блока `async with`.
+
+        Args:
+            priority: Приоритет в очереди.
+            rounds: Сколько раундов выполняется под этим слотом; нужно, чтобы пакетная генерация не
+                искажала оценку длительности одного раунда.
+
+        Raises:
+            AdmissionRejectedError: Очередь полна, раунд вытеснили или он не успевает к дедлайну.
+        """
+        await self._acquire(priority)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self._release()
+
+        elapsed_s = (perf_counter() - started) / max(rounds, 1)
+        self._round_s += ROUND_TIME_SMOOTHING * (elapsed_s - self._round_s)
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self._active < self._max_concurrency and not self._queue:
+            self._active += 1
+            admission_wait_latency.observe(0.0, priority=priority.name.lower())
+            return
+
+        self.ensure_capacity(priority)
+        evicted = self._evictable(priority) if len(self._queue) >= self._queue_size else None
+        if evicted is not None:
+            self._drop(evicted)
+            evicted.future.set_exception(
+                AdmissionRejectedError("Evicted by a higher-priority round", self.retry_after_s(evicted.priority))
+            )
+            admission_rejected.inc(priority=evicted.priority.name.lower(), reason="evicted")
+
+        waiter = _Waiter(priority, next(self._sequence), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        admission_queue_depth.set(len(self._queue))
+
+        deadline_s = self._deadline_for(priority)
+        # Ждём не дольше, чем оставляет дедлайн с учётом ожидаемой длительности самого раунда.
+        timeout_s = None if deadline_s is None else max(deadline_s - self._round_s, 0.0)
+        started = perf_counter()
+        try:
+            done, _ = await asyncio.wait((waiter.future,), timeout=timeout_s)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        if not done:
+            self._abandon(waiter)
+            self._reject(priority, "deadline")
+
+        admission_wait_latency.observe(perf_counter() - started, priority=priority.name.lower())
+        waiter.future.result()
+
+    def _release(self) -> None:
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                admission_queue_depth.set(len(self._queue))
+                # Слот переходит следующему без уменьшения счётчика активных раундов.
+                waiter.future.set_result(None)
+                return
+
+        admission_queue_depth.set(0)
+        self._active -= 1
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+            # Слот уже передан этому ожидающему, но забрать его некому.
+            self._release()
+            return
+
+        waiter.future.cancel()
+        self._drop(waiter)
+
+    def _drop(self, waiter: _Waiter) -> None:
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+        admission_queue_depth.set(len(self._queue))
+
+    def _evictable(self, priority: Priority) -> _Waiter | None:
+        candidates = [waiter for waiter in self._queue if waiter.priority > priority]
+        return max(candidates, default=None)
+
+    def _deadline_for(self, priority: Priority) -> float | None:
+        return self._deadline_s if priority is Priority.INTERACTIVE else None
+
+    def _estimated_wait_s(self, priority: Priority) -> float:
+        if self._active < self._max_concurrency and not self._queue:
+            return 0.0
+
+        ahead = sum(1 for waiter in self._queue if waiter.priority <= priority)
+        return math.ceil((ahead + 1) / self._max_concurrency) * self._round_s
+
+    def _reject(self, priority: Priority, reason: str) -> None:
+        retry_after_s = self.retry_after_s(priority)
+        admission_rejected.inc(priority=priority.name.lower(), reason=reason)
+        logger.warning(
+            "admission.rejected",
+            priority=priority.name.lower(),
+            reason=reason,
+            active=self._active,
+            queued=len(self._queue),
+            retry_after_s=retry_after_s,
+        )
+        raise AdmissionRejectedError(f"Round rejected by admission control: {reason}", retry_after_s)
+
+
+admission = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    deadline_s=settings.ADMISSION_DEADLINE_S,
+    expected_round_s=settings.ADMISSION_EXPECTED_ROUND_S,
+)
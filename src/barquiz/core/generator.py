@@ -1,19 +1,63 @@
+import asyncio
 import random
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Final
 
 import structlog
-from barquiz.config import settings
+from pydantic import ValidationError
+
+from barquiz.config import GenerationProfile, settings
+from barquiz.core.admission import Priority, admission
 from barquiz.core.data import TOPICS, VIBES
-from barquiz.models import DataGatheringResult, QuestionItem
+from barquiz.models import DataGatheringResult, QuestionItem, RoundItem
+from barquiz.utils.context_cache import CachedContext, context_cache
+from barquiz.utils.context_packing import pack_context
+from barquiz.utils.corpus import get_corpus
 from barquiz.utils.http_client import fetch_urls
-from barquiz.utils.ollama import query_llm
-from barquiz.utils.search import search_ddg
+from barquiz.utils.metrics import gather_coalesced, generator_fallbacks
+from barquiz.utils.ollama import OllamaOverloadedError, query_llm, stream_llm
+from barquiz.utils.paragraph_index import paragraph_index
+from barquiz.utils.search import SearchStream
+from barquiz.utils.tracing import Span, span
 
 logger = structlog.get_logger(__name__)
 
+_refresh_tasks: dict[str, asyncio.Task[None]] = {}
+
+
+@dataclass(slots=True)
+class _GatherFlight:
+    """Сбор контекста по теме, который ждут один или несколько запросов."""
+
+    task: asyncio.Task[tuple[DataGatheringResult | None, dict[str, float]]]
+    waiters: int = 0
+
+
+_gather_flights: dict[str, _GatherFlight] = {}
+
+
+def topic_key(topic: str) -> str:
+    """Нормализует тему в ключ кэша, снапшота и single-flight: регистр и пробелы не важны."""
+    return " ".join(topic.lower().split())
+
 
 async def gather_quiz_context(topic: str) -> tuple[DataGatheringResult | None, dict[str, float]]:
     """Ищет источники и собирает очищенный текстовый контекст.
 
+    Сначала смотрит в персистентный кэш контекста: свежая запись возвращается без обращения к сети,
+    устаревшая — возвращается сразу и обновляется в фоне (stale-while-revalidate). При промахе кэша
+    контекст собирается из локального индекса абзацев, если в нём достаточно подходящих абзацев, и
+    только иначе — из сети. Если сеть недоступна, отдаётся даже просроченная запись.
+
+    Если сеть не дала контекста, он берётся из снапшота тем (`SNAPSHOT_PATH`); с `OFFLINE_MODE` сеть не
+    используется вовсе, а контекст берётся из кэша и снапшота.
+
+    Одновременные вызовы с одной и той же нормализованной темой делят один сбор (single-flight): поиск и
+    загрузка страниц выполняются один раз, а результат получают все ожидающие. Сбор отменяется, только
+    когда его перестали ждать все вызвавшие.
+
     Args:
         topic: Тема запроса.
 
@@ -21,20 +65,185 @@ async def gather_quiz_context(topic: str) -> tuple[DataGatheringResult | None, d
         Кортеж из результата с URL-адресами, текстом и метаданными или None, если ничего не найдено,
         а также словаря сетевых метрик.
     """
+    with span("gather_quiz_context", topic=topic) as gather_span:
+        key = topic_key(topic)
+        flight = _gather_flights.get(key)
+        if flight is None:
+            flight = _GatherFlight(task=asyncio.create_task(_gather_context(topic, gather_span)))
+            _gather_flights[key] = flight
+            flight.task.add_done_callback(lambda _: _forget_flight(key, flight))
+        else:
+            gather_coalesced.inc()
+            gather_span.set(coalesced=True)
+            logger.info("gather.coalesced", topic=topic, waiters=flight.waiters + 1)
+
+        flight.waiters += 1
+        try:
+            # shield: отмена одного из ожидающих не должна обрывать сбор для остальных.
+            result, timings = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Отменённая задача завершается не сразу, поэтому полёт снимается заранее: новый вызов с
+                # той же темой должен начать свой сбор, а не присоединиться к отменяемому.
+                _forget_flight(key, flight)
+                flight.task.cancel()
+
+        gather_span.set(found=result is not None, text_length=result.text_length if result else 0)
+        return result, timings
+
+
+def _forget_flight(key: str, flight: _GatherFlight) -> None:
+    if _gather_flights.get(key) is flight:
+        del _gather_flights[key]
+
+
+async def _gather_context(topic: str, gather_span: Span) -> tuple[DataGatheringResult | None, dict[str, float]]:
+    try:
+        result, timings = await _gather_with_cache(topic, gather_span)
+    except asyncio.TimeoutError:
+        result = _gather_from_snapshot(topic, gather_span)
+        if result is None:
+            raise
+        return result, {}
+
+    # Результат снапшота не кладётся в кэш контекста, чтобы следующий запрос снова попробовал сеть.
+    return (result, timings) if result else (_gather_from_snapshot(topic, gather_span), timings)
+
+
+def _gather_from_snapshot(topic: str, gather_span: Span) -> DataGatheringResult | None:
+    corpus = get_corpus(settings.cache_path(settings.SNAPSHOT_PATH) if settings.SNAPSHOT_PATH else None)
+    if corpus is None:
+        return None
+
+    result = corpus.get(topic_key(topic))
+    gather_span.set(snapshot="hit" if result else "miss")
+    logger.info("snapshot.lookup", topic=topic, found=result is not None, offline=settings.OFFLINE_MODE)
+    return result
+
+
+async def _gather_with_cache(topic: str, gather_span: Span) -> tuple[DataGatheringResult | None, dict[str, float]]:
+    if not settings.CONTEXT_CACHE_ENABLED:
+        return await _gather_uncached(topic, gather_span)
+
+    key = topic_key(topic)
+    cached = await context_cache.get(key)
+    if cached and cached.age_s < settings.CONTEXT_CACHE_TTL_S:
+        gather_span.set(cache="hit")
+        logger.info("context_cache.hit", topic=topic, age_s=cached.age_s)
+        return cached.result, {}
+
+    if cached and cached.age_s < settings.CONTEXT_CACHE_TTL_S + settings.CONTEXT_CACHE_STALE_S:
+        gather_span.set(cache="stale")
+        logger.info("context_cache.stale", topic=topic, age_s=cached.age_s)
+        if not settings.OFFLINE_MODE:
+            _schedule_refresh(key, topic)
+        return cached.result, {}
+
+    gather_span.set(cache="miss")
+    logger.info("context_cache.miss", topic=topic)
+    try:
+        result, timings = await _gather_uncached(topic, gather_span)
+    except asyncio.TimeoutError:
+        if not cached:
+            raise
+        return _serve_expired(topic, cached), {}
+
+    if not result:
+        return (_serve_expired(topic, cached), timings) if cached else (None, timings)
+
+    await context_cache.put(key, result)
+    return result, timings
+
+
+async def _gather_uncached(topic: str, gather_span: Span) -> tuple[DataGatheringResult | None, dict[str, float]]:
+    indexed = await _gather_from_index(topic, gather_span)
+    if indexed:
+        return indexed, {}
+    if settings.OFFLINE_MODE:
+        return None, {}
+    return await gather_from_network(topic)
+
+
+async def _gather_from_index(topic: str, gather_span: Span) -> DataGatheringResult | None:
+    if not settings.INDEX_ENABLED:
+        return None
+
+    with span("search_index", topic=topic) as index_span:
+        context = await paragraph_index.search(topic, settings.CONTEXT_TARGET_CHARS)
+        index_span.set(found=context is not None)
+    gather_span.set(index="hit" if context else "miss")
+    if context is None:
+        logger.info("paragraph_index.miss", topic=topic)
+        return None
+
+    text = "\n".join(context.paragraphs)
+    logger.info("paragraph_index.hit", topic=topic, paragraphs=len(context.paragraphs), urls=len(context.urls))
+    return DataGatheringResult(
+        topic=topic,
+        urls=context.urls,
+        text=text,
+        text_length=len(text),
+        text_preview=text[:500],
+    )
+
+
+def _serve_expired(topic: str, cached: CachedContext) -> DataGatheringResult:
+    logger.warning("context_cache.serve_expired", topic=topic, age_s=cached.age_s)
+    return cached.result
+
+
+def _schedule_refresh(key: str, topic: str) -> None:
+    if key in _refresh_tasks:
+        return
+
+    task = asyncio.create_task(_refresh_context(key, topic), name=f"context-refresh:{key}")
+    _refresh_tasks[key] = task
+    task.add_done_callback(lambda _: _refresh_tasks.pop(key, None))
+
+
+async def _refresh_context(key: str, topic: str) -> None:
+    try:
+        result, _ = await gather_from_network(topic)
+    except asyncio.TimeoutError:
+        logger.warning("context_cache.refresh_timeout", topic=topic)
+        return
+
+    if result:
+        await context_cache.put(key, result)
+        logger.info("context_cache.refreshed", topic=topic)
+
+
+async def gather_from_network(topic: str) -> tuple[DataGatheringResult | None, dict[str, float]]:
+    """Собирает контекст темы только из сети: поиск DuckDuckGo и загрузка найденных страниц.
+
+    Кэш контекста, индекс абзацев и снапшот не используются; запись в индекс делает загрузчик страниц.
+
+    Args:
+        topic: Тема запроса.
+
+    Returns:
+        Кортеж из результата или None, если поиск не дал адресов или страницы не дали текста, а также
+        словаря сетевых метрик.
+    """
     timings: dict[str, float] = {}
 
     logger.info("search.start", topic=topic)
-    urls, search_latency = await search_ddg(topic)
-    timings["network_latency_search_ms"] = search_latency
+    search = SearchStream(topic)
+    context_text, download_latency = await fetch_urls(
+        search,
+        topic,
+        target_chars=settings.CONTEXT_TARGET_CHARS,
+        quorum=settings.FETCH_QUORUM_PAGES,
+    )
+    timings["network_latency_search_ms"] = search.latency_ms
+    timings["network_latency_download_ms"] = download_latency
+    urls = search.urls
 
     if not urls:
         logger.warning("search.no_urls", topic=topic)
         return None, timings
 
-    logger.info("fetch.start", urls_count=len(urls))
-    context_text, download_latency = await fetch_urls(urls, topic)
-    timings["network_latency_download_ms"] = download_latency
-
     if not context_text:
         logger.warning("fetch.no_text", topic=topic, urls_count=len(urls))
         return None, timings
@@ -65,16 +274,12 @@ def _build_fallback_context(topic: str) -> str:
     )
 
 
-def _build_prompt(selected_topic: str, selected_vibe: str, context_text: str) -> str:
-    return f"""
+SYSTEM_PROMPT: Final[str] = """
 Ты — весёлый и немного циничный бармен, ведущий игры "Барный Блеф: Что бы ты выбрал?".
 
-Тема: {selected_topic}.
-Вайб: {selected_vibe}.
-
-Твоя задача: придумай 10 оригинальных и забавных барных вопросов в стиле "Would You Rather" для квиза. Для каждого вопроса добавь краткий ответ, факт или шутку, который подойдёт как правильный вариант.
+Твоя задача: по теме и вайбу из сообщения пользователя придумай 10 оригинальных и забавных барных вопросов в стиле "Would You Rather" для квиза. Для каждого вопроса добавь краткий ответ, факт или шутку, который подойдёт как правильный вариант.
 
-Используй текст ниже только как источник деталей (ингредиенты, предметы интерьера, атмосферу) и превращай их в абсурдные гипотетические ситуации. Если текст выглядит общим, используй свои знания и фантазию.
+Используй текст из сообщения пользователя только как источник деталей (ингредиенты, предметы интерьера, атмосферу) и превращай их в абсурдные гипотетические ситуации. Если текст выглядит общим, используй свои знания и фантазию.
 
 Запреты:
 - Не задавай экзаменационные или фактические вопросы по тексту: никаких адресов, часов работы, лет, цен, имён реальных баров или авторов.
@@ -87,14 +292,14 @@ def _build_prompt(selected_topic: str, selected_vibe: str, context_text: str) ->
 3. Если вопрос предлагает выбор, он обязательно содержит фразу "Что бы ты выбрал".
 4. Если вопрос описывает ситуацию, обязательно содержит фразу "Что бы ты сделал".
 5. Разнообразь формулировки, избегай одинаковых начал. Можно использовать персонажей (пьяный бармен, бывшая, охранник клуба, таксист, сосед, барная стойка, официант, попугай, барменша из 2007 года).
-6. {selected_vibe}.
+6. Выдерживай вайб из сообщения пользователя.
 
 Формат ответа:
-{{
+{
   "data": [
-    {{"title": "барный вопрос", "value": "краткий ответ"}}
+    {"title": "барный вопрос", "value": "краткий ответ"}
   ]
-}}
+}
 Строго следуй схеме: внутри "data" должно быть ровно 10 элементов. Верни только валидный JSON без Markdown и пояснений.
 
 Примеры (используй как шаблон, как детали превращаются в абсурдные вопросы):
@@ -102,50 +307,229 @@ def _build_prompt(selected_topic: str, selected_vibe: str, context_text: str) ->
 Вопрос: "Что бы ты выбрал: пить текилу за школьной партой под взглядом учителя ИЛИ из лейки на перемене?"
 Текст: "Автор рецепта добавил можжевельниковый дым и крыжовник."
 Вопрос: "Что бы ты выбрал: вдохнуть дым можжевльника перед тостом ИЛИ бросить крыжовник в пунш как угли?"
+""".strip()
+
+
+def _build_prompt(selected_topic: str, selected_vibe: str, context_text: str) -> str:
+    # Всё, что меняется от запроса к запросу, идёт в сообщение пользователя после неизменного
+    # SYSTEM_PROMPT: так Ollama переиспользует KV-кэш общего префикса между раундами.
+    return f"""Тема: {selected_topic}.
+Вайб: {selected_vibe}.
 
 Текст для вдохновения:
-{context_text[:10000]}
-    """
+{context_text}"""
 
 
-async def generate_round_questions(topic: str | None = None) -> list[QuestionItem]:
-    """Формирует вопросы для раунда на основе контекста из поиска и Ollama.
+@dataclass(slots=True)
+class RoundPrompt:
+    """Подготовленный промпт раунда вместе с данными для логирования."""
 
-    Args:
-        topic: Тема для поиска. Если не передана или пустая, выбирается случайная тема.
+    topic: str
+    vibe: str
+    profile: GenerationProfile
+    profile_name: str
+    prompt: str
+    gather_result: DataGatheringResult | None
+    network_timings: dict[str, float]
 
-    Returns:
-        Сформированный список вопросов и ответов для раунда.
-    """
+
+async def _prepare_round(topic: str | None, profile_name: str | None) -> RoundPrompt:
     selected_topic: str = topic.strip() if topic and topic.strip() else random.choice(TOPICS)
     selected_vibe: str = random.choice(VIBES).capitalize()
+    profile = settings.generation_profile(profile_name)
 
     gather_result, network_timings = await gather_quiz_context(selected_topic)
 
-    prompt_context = _build_fallback_context(selected_topic) if not gather_result else gather_result.text
-
-    prompt = _build_prompt(selected_topic, selected_vibe, prompt_context)
+    if gather_result:
+        with span("pack_context", max_tokens=profile.context_tokens) as pack_span:
+            # MinHash по десяткам абзацев занимает десятки миллисекунд — не держим на этом event loop.
+            packed = await asyncio.to_thread(pack_context, gather_result.text, selected_topic, profile.context_tokens)
+            pack_span.set(paragraphs=packed.paragraphs, duplicates=packed.duplicates, packed=packed.packed)
+        logger.info(
+            "context.packed",
+            topic=selected_topic,
+            paragraphs=packed.paragraphs,
+            duplicates=packed.duplicates,
+            packed=packed.packed,
+            estimated_tokens=packed.estimated_tokens,
+            max_tokens=profile.context_tokens,
+        )
+        prompt_context = packed.text
+    else:
+        prompt_context = _build_fallback_context(selected_topic)
+
+    with span("build_prompt", context_length=len(prompt_context)):
+        prompt = _build_prompt(selected_topic, selected_vibe, prompt_context)
 
     if not gather_result:
+        generator_fallbacks.inc()
         logger.warning("generator.fallback", topic=selected_topic)
 
-    logger.info("ollama.query.start", model=settings.OLLAMA_MODEL)
-    llm_result, inference_latency_ms = await query_llm(prompt)
+    return RoundPrompt(
+        topic=selected_topic,
+        vibe=selected_vibe,
+        profile=profile,
+        profile_name=profile_name or settings.GENERATION_PROFILE,
+        prompt=prompt,
+        gather_result=gather_result,
+        network_timings=network_timings,
+    )
 
-    network_latency_ms = network_timings.get("network_latency_search_ms", 0.0) + network_timings.get(
-        "network_latency_download_ms", 0.0
+
+def _log_generation_completed(round_prompt: RoundPrompt, inference_latency_ms: float, streamed: bool) -> None:
+    network_timings = round_prompt.network_timings
+    # Поиск и загрузка идут конвейером с общего старта, поэтому сетевое время — максимум, а не сумма.
+    network_latency_ms = max(
+        network_timings.get("network_latency_search_ms", 0.0),
+        network_timings.get("network_latency_download_ms", 0.0),
     )
 
     logger.info(
         "quiz_generation.completed",
-        topic=selected_topic,
-        vibe=selected_vibe,
+        topic=round_prompt.topic,
+        vibe=round_prompt.vibe,
+        profile=round_prompt.profile_name,
+        model=round_prompt.profile.model,
         network_latency_ms=network_latency_ms,
         network_latency_search_ms=network_timings.get("network_latency_search_ms", 0.0),
         network_latency_download_ms=network_timings.get("network_latency_download_ms", 0.0),
         inference_latency_ms=inference_latency_ms,
-        urls_count=len(gather_result.urls) if gather_result else 0,
-        used_fallback=not gather_result,
+        urls_count=len(round_prompt.gather_result.urls) if round_prompt.gather_result else 0,
+        used_fallback=not round_prompt.gather_result,
+        streamed=streamed,
     )
 
+
+async def generate_round_questions(
+    topic: str | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    profile: str | None = None,
+) -> list[QuestionItem]:
+    """Формирует вопросы для раунда на основе контекста из поиска и Ollama.
+
+    Args:
+        topic: Тема для поиска. Если не передана или пустая, выбирается случайная тема.
+        priority: Приоритет раунда в очереди admission control.
+        profile: Имя профиля генерации из `GENERATION_PROFILES`; None — профиль по умолчанию.
+
+    Returns:
+        Сформированный список вопросов и ответов для раунда.
+
+    Raises:
+        AdmissionRejectedError: Раунд не принят в работу из-за перегрузки.
+    """
+    async with admission.slot(priority):
+        round_prompt = await _prepare_round(topic, profile)
+
+        logger.info("ollama.query.start", model=round_prompt.profile.model, profile=round_prompt.profile_name)
+        llm_result, inference_latency_ms = await query_llm(round_prompt.prompt, round_prompt.profile, SYSTEM_PROMPT)
+
+    _log_generation_completed(round_prompt, inference_latency_ms, streamed=False)
+
     return [QuestionItem(**item) for item in llm_result]
+
+
+async def generate_rounds(
+    topics: list[str | None],
+    priority: Priority = Priority.INTERACTIVE,
+    profile: str | None = None,
+) -> list[RoundItem]:
+    """Генерирует пакет раундов: контексты собираются параллельно, инференсы идут подряд.
+
+    Модель получает следующий промпт сразу после предыдущего, пока контексты остальных тем ещё
+    собираются, поэтому она не простаивает и не выгружается между раундами. Одинаковые темы делят
+    один сбор контекста через single-flight в `gather_quiz_context`. Пакет занимает один слот
+    admission control.
+
+    Args:
+        topics: Темы раундов; None или пустая строка означают случайную тему.
+        priority: Приоритет пакета в очереди admission control.
+        profile: Имя профиля генерации для всех раундов пакета; None — профиль по умолчанию.
+
+    Returns:
+        Раунды в порядке тем. Раунд, который не удалось собрать, приходит с пустым списком вопросов.
+
+    Raises:
+        AdmissionRejectedError: Пакет не принят в работу из-за перегрузки.
+        OllamaOverloadedError: Очередь к Ollama переполнена; уже готовые раунды пакета отбрасываются.
+    """
+    rounds = [RoundItem(topic=topic, data=[]) for topic in topics]
+
+    async def prepare(index: int, topic: str | None) -> tuple[int, RoundPrompt]:
+        return index, await _prepare_round(topic, profile)
+
+    async with admission.slot(priority, rounds=len(topics)):
+        pending = [asyncio.create_task(prepare(index, topic)) for index, topic in enumerate(topics)]
+        try:
+            for prepared in asyncio.as_completed(pending):
+                try:
+                    index, round_prompt = await prepared
+                except Exception:
+                    logger.exception("generator.batch_round_failed")
+                    continue
+
+                logger.info(
+                    "ollama.query.start",
+                    model=round_prompt.profile.model,
+                    profile=round_prompt.profile_name,
+                    batch_index=index,
+                )
+                try:
+                    llm_result, inference_latency_ms = await query_llm(
+                        round_prompt.prompt, round_prompt.profile, SYSTEM_PROMPT
+                    )
+                    questions = [QuestionItem(**item) for item in llm_result]
+                except OllamaOverloadedError:
+                    # Перегрузка касается всего пакета: API отвечает на неё 503 с Retry-After.
+                    raise
+                except Exception:
+                    # Ошибка модели или её ответа в одном раунде не должна отменять уже готовые раунды пакета.
+                    logger.exception("generator.batch_round_failed", batch_index=index, topic=round_prompt.topic)
+                    continue
+
+                _log_generation_completed(round_prompt, inference_latency_ms, streamed=False)
+                rounds[index] = RoundItem(topic=round_prompt.topic, data=questions)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    logger.info(
+        "generator.batch_completed",
+        rounds=len(rounds),
+        empty_rounds=sum(not item.data for item in rounds),
+    )
+    return rounds
+
+
+async def stream_round_questions(
+    topic: str | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    profile: str | None = None,
+) -> AsyncIterator[QuestionItem]:
+    """Формирует вопросы раунда и отдаёт каждый из них, как только модель его закончила.
+
+    Args:
+        topic: Тема для поиска. Если не передана или пустая, выбирается случайная тема.
+        priority: Приоритет раунда в очереди admission control.
+        profile: Имя профиля генерации из `GENERATION_PROFILES`; None — профиль по умолчанию.
+
+    Yields:
+        Вопросы раунда по одному.
+
+    Raises:
+        AdmissionRejectedError: Раунд не принят в работу из-за перегрузки.
+    """
+    async with admission.slot(priority):
+        round_prompt = await _prepare_round(topic, profile)
+
+        logger.info("ollama.stream.start", model=round_prompt.profile.model, profile=round_prompt.profile_name)
+        started = perf_counter()
+        async for item in stream_llm(round_prompt.prompt, round_prompt.profile, SYSTEM_PROMPT):
+            try:
+                question = QuestionItem.model_validate(item)
+            except ValidationError:
+                logger.warning("generator.stream_item_invalid", item=item)
+                continue
+            yield question
+
+    _log_generation_completed(round_prompt, (perf_counter() - started) * 1000, streamed=True)
@@ -0,0 +1,258 @@
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Final
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.core.admission import Priority
+from barquiz.core.generator import generate_round_questions, generate_rounds
+from barquiz.models import PoolStatus, QuestionItem, RoundItem
+from barquiz.utils.ollama import OllamaOverloadedError
+
+logger = structlog.get_logger(__name__)
+
+RANDOM_TOPIC_KEY: Final[str] = ""
+# Сколько разовых тем помнить, чтобы заметить повторный запрос.
+MAX_CANDIDATE_TOPICS: Final[int] = 1000
+
+
+@dataclass(slots=True)
+class PooledRound:
+    """Готовый раунд, ожидающий выдачи клиенту."""
+
+    questions: list[QuestionItem]
+    created_at: float = field(default_factory=monotonic)
+
+
+@dataclass(slots=True)
+class PoolCounters:
+    """Счётчики попаданий, промахов и пополнений пула."""
+
+    hits: int = 0
+    misses: int = 0
+    refills: int = 0
+    refill_failures: int = 0
+    expired: int = 0
+
+
+def _pool_key(topic: str | None) -> str:
+    return topic.strip() if topic and topic.strip() else RANDOM_TOPIC_KEY
+
+
+class RoundPool:
+    """Пул заранее сгенерированных раундов, который пополняется фоновым воркером.
+
+    Для темы из `POOL_PREWARM_TOPICS`, случайной темы из `TOPICS` и темы, которую запросили хотя бы
+    дважды за `POOL_TTL_S`, держит до `POOL_SIZE` готовых раундов, дозаполняет очередь, когда она
+    опускается ниже `POOL_LOW_WATER`, и выбрасывает раунды старше `POOL_TTL_S`. Разовые темы в пул
+    не попадают, чтобы не генерировать впрок раунды, которые никто не заберёт. Если пул для темы пуст,
+    раунд генерируется вживую.
+    """
+
+    def __init__(self) -> None:
+        self._rounds: OrderedDict[str, deque[PooledRound]] = OrderedDict()
+        self._pinned: set[str] = set()
+        self._candidates: OrderedDict[str, float] = OrderedDict()
+        self._counters = PoolCounters()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        """Регистрирует темы для прогрева и запускает фоновый воркер."""
+        if not settings.POOL_ENABLED or self._worker:
+            return
+
+        for key in (RANDOM_TOPIC_KEY, *(_pool_key(topic) for topic in settings.POOL_PREWARM_TOPICS)):
+            self._pinned.add(key)
+            self._track(key)
+
+        self._wakeup.set()
+        self._worker = asyncio.create_task(self._run(), name="round-pool-worker")
+        logger.info("pool.started", topics=len(self._rounds), size=settings.POOL_SIZE)
+
+    async def stop(self) -> None:
+        """Останавливает фоновый воркер."""
+        if not self._worker:
+            return
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logger.info("pool.stopped")
+
+    async def get_round(self, topic: str | None, profile: str | None = None) -> list[QuestionItem]:
+        """Выдаёт готовый раунд из пула или генерирует его вживую.
+
+        Args:
+            topic: Тема раунда. Пустая тема означает случайную тему из `TOPICS`.
+            profile: Профиль генерации; пул хранит только раунды профиля по умолчанию.
+
+        Returns:
+            Список вопросов раунда.
+        """
+        ready = self.take_ready(topic, profile)
+        if ready is not None:
+            return ready
+
+        return await generate_round_questions(_pool_key(topic) or None, profile=profile)
+
+    async def get_rounds(self, topics: list[str | None], profile: str | None = None) -> list[RoundItem]:
+        """Выдаёт пакет раундов: готовые берутся из пула, остальные генерируются одним пакетом.
+
+        Args:
+            topics: Темы раундов. Пустая тема означает случайную тему из `TOPICS`.
+            profile: Профиль генерации; пул хранит только раунды профиля по умолчанию.
+
+        Returns:
+            Раунды в порядке тем.
+        """
+        rounds: list[RoundItem | None] = []
+        for topic in topics:
+            ready = self.take_ready(topic, profile)
+            rounds.append(RoundItem(topic=_pool_key(topic) or None, data=ready) if ready is not None else None)
+
+        missing = [index for index, item in enumerate(rounds) if item is None]
+        if missing:
+            generated = await generate_rounds([_pool_key(topics[index]) or None for index in missing], profile=profile)
+            for index, item in zip(missing, generated):
+                rounds[index] = item
+
+        return [item for item in rounds if item is not None]
+
+    def take_ready(self, topic: str | None, profile: str | None = None) -> list[QuestionItem] | None:
+        """Забирает готовый раунд из пула, не запуская живую генерацию.
+
+        Args:
+            topic: Тема раунда. Пустая тема означает случайную тему из `TOPICS`.
+            profile: Профиль генерации; пул хранит только раунды профиля по умолчанию.
+
+        Returns:
+            Список вопросов или None, если для темы нет готовых раундов.
+        """
+        if not settings.POOL_ENABLED or profile not in (None, settings.GENERATION_PROFILE):
+            return None
+
+        key = _pool_key(topic)
+        if key not in self._rounds and not self._is_repeated(key):
+            self._counters.misses += 1
+            logger.info("pool.miss", topic=key, tracked=False)
+            return None
+
+        self._track(key)
+        self._drop_expired(key)
+        rounds = self._rounds[key]
+        if not rounds:
+            self._counters.misses += 1
+            self._wakeup.set()
+            logger.info("pool.miss", topic=key)
+            return None
+
+        pooled = rounds.popleft()
+        self._counters.hits += 1
+        if len(rounds) < settings.POOL_LOW_WATER:
+            self._wakeup.set()
+        logger.info("pool.hit", topic=key, ready=len(rounds))
+        return pooled.questions
+
+    def status(self) -> PoolStatus:
+        """Возвращает метрики пула и число готовых раундов по темам."""
+        lookups = self._counters.hits + self._counters.misses
+        return PoolStatus(
+            enabled=settings.POOL_ENABLED,
+            hits=self._counters.hits,
+            misses=self._counters.misses,
+            hit_ratio=self._counters.hits / lookups if lookups else 0.0,
+            refills=self._counters.refills,
+            refill_failures=self._counters.refill_failures,
+            expired=self._counters.expired,
+            ready={key or "<random>": len(rounds) for key, rounds in self._rounds.items()},
+        )
+
+    def _is_repeated(self, key: str) -> bool:
+        now = monotonic()
+        requested_at = self._candidates.pop(key, None)
+        if requested_at is not None and now - requested_at < settings.POOL_TTL_S:
+            return True
+
+        self._candidates[key] = now
+        while len(self._candidates) > MAX_CANDIDATE_TOPICS:
+            self._candidates.popitem(last=False)
+        return False
+
+    def _track(self, key: str) -> None:
+        if key in self._rounds:
+            self._rounds.move_to_end(key)
+            return
+
+        self._rounds[key] = deque()
+        while len(self._rounds) > settings.POOL_MAX_TOPICS:
+            evicted = next((name for name in self._rounds if name not in self._pinned), None)
+            if evicted is None:
+                break
+            del self._rounds[evicted]
+            logger.info("pool.topic_evicted", topic=evicted)
+
+    def _drop_expired(self, key: str) -> None:
+        rounds = self._rounds[key]
+        deadline = monotonic() - settings.POOL_TTL_S
+        while rounds and rounds[0].created_at < deadline:
+            rounds.popleft()
+            self._counters.expired += 1
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            for key in list(self._rounds):
+                if key not in self._rounds:
+                    continue
+                self._drop_expired(key)
+                if len(self._rounds[key]) < settings.POOL_LOW_WATER:
+                    await self._refill(key)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.POOL_REFILL_INTERVAL_S)
+            except TimeoutError:
+                pass
+
+    async def _refill(self, key: str) -> None:
+        while key in self._rounds and len(self._rounds[key]) < settings.POOL_SIZE:
+            try:
+                questions = await generate_round_questions(key or None, priority=Priority.BACKGROUND)
+            except OllamaOverloadedError:
+                self._counters.refill_failures += 1
+                logger.warning("pool.refill_overloaded", topic=key)
+                return
+            except asyncio.CancelledError:
+                # Отмена самого воркера пробрасывается, а отмена, пришедшая изнутри пайплайна, — такой же сбой.
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise
+                self._counters.refill_failures += 1
+                logger.warning("pool.refill_cancelled", topic=key)
+                return
+            except Exception:
+                # Воркер должен пережить любой сбой пайплайна, иначе пул перестанет пополняться.
+                self._counters.refill_failures += 1
+                logger.exception("pool.refill_failed", topic=key)
+                return
+
+            if not questions:
+                self._counters.refill_failures += 1
+                logger.warning("pool.refill_empty", topic=key)
+                return
+
+            if key not in self._rounds:
+                return
+
+            self._rounds[key].append(PooledRound(questions=questions))
+            self._counters.refills += 1
+            logger.info("pool.refilled", topic=key, ready=len(self._rounds[key]))
+
+
+round_pool = RoundPool()
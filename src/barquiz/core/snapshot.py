@@ -0,0 +1,86 @@
+"""Сборка снапшота контекста по всем темам из `TOPICS` для офлайн-режима.
+
+    uv run python -m barquiz.core.snapshot --output snapshot/topics.bqc
+
+Для каждой темы выполняется обычный сетевой сбор контекста (поиск и загрузка страниц), результаты
+записываются в сжатый индексированный корпус (`utils/corpus.py`). Чтобы сервис брал контекст из
+снапшота, укажите путь к нему в `SNAPSHOT_PATH`, а для работы совсем без сети — `OFFLINE_MODE=true`.
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.core.data import TOPICS
+from barquiz.core.generator import gather_from_network, topic_key
+from barquiz.logging_config import configure_logging
+from barquiz.models import DataGatheringResult
+from barquiz.utils.corpus import write_corpus
+from barquiz.utils.http_client import (
+    close_extract_executor,
+    close_http_client,
+    start_extract_executor,
+    start_http_client,
+)
+
+logger = structlog.get_logger(__name__)
+
+
+async def crawl_topics(topics: list[str], concurrency: int) -> dict[str, DataGatheringResult]:
+    """Собирает контекст по темам через сеть, не больше `concurrency` тем одновременно.
+
+    Args:
+        topics: Темы для сбора.
+        concurrency: Сколько тем собирается параллельно.
+
+    Returns:
+        Результаты по нормализованным ключам тем; темы без контекста пропускаются.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def crawl(topic: str) -> DataGatheringResult | None:
+        async with semaphore:
+            try:
+                result, _ = await gather_from_network(topic)
+            except asyncio.TimeoutError:
+                logger.warning("snapshot.topic_timeout", topic=topic)
+                return None
+        if result is None:
+            logger.warning("snapshot.topic_empty", topic=topic)
+        return result
+
+    await start_http_client()
+    await start_extract_executor()
+    try:
+        results = await asyncio.gather(*(crawl(topic) for topic in topics))
+    finally:
+        await close_extract_executor()
+        await close_http_client()
+
+    return {topic_key(topic): result for topic, result in zip(topics, results) if result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=settings.cache_path(settings.SNAPSHOT_PATH or "topics.bqc"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    configure_logging()
+    topics = list(dict.fromkeys(TOPICS))
+    entries = asyncio.run(crawl_topics(topics, args.concurrency))
+    size = write_corpus(args.output, entries)
+    logger.info(
+        "snapshot.written",
+        path=str(args.output),
+        topics=len(entries),
+        missing=len(topics) - len(entries),
+        size_bytes=size,
+    )
+
+
+if __name__ == "__main__":
+    main()
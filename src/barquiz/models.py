@@ -1,4 +1,13 @@
-from pydantic import BaseModel
+from enum import StrEnum
+
+from typing import Self
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class StreamErrorCode(StrEnum):
+    OVERLOADED = "overloaded"
+    FAILED = "failed"
 
 
 class QuestionItem(BaseModel):
@@ -10,6 +19,38 @@ class QuestionsResponse(BaseModel):
     data: list[QuestionItem]
 
 
+class StreamError(BaseModel):
+    """Последняя строка NDJSON-потока вопросов, если раунд оборвался ошибкой."""
+
+    error: StreamErrorCode
+    detail: str
+
+
+class RoundsRequest(BaseModel):
+    """Запрос пакетной генерации: список тем или число раундов на случайные темы."""
+
+    topics: list[str] = Field(default_factory=list)
+    count: int = Field(default=0, ge=0)
+    profile: str | None = None
+
+    @model_validator(mode="after")
+    def _check_topics_or_count(self) -> Self:
+        if self.topics and self.count:
+            raise ValueError("Pass either topics or count, not both")
+        return self
+
+
+class RoundItem(BaseModel):
+    """Один раунд пакета."""
+
+    topic: str | None
+    data: list[QuestionItem]
+
+
+class RoundsResponse(BaseModel):
+    rounds: list[RoundItem]
+
+
 class DataGatheringResult(BaseModel):
     """Результат этапа поиска и сбора текста."""
 
@@ -18,3 +59,49 @@ class DataGatheringResult(BaseModel):
     text: str
     text_length: int
     text_preview: str
+
+
+class SpanView(BaseModel):
+    """Спан трассы с отступом от начала трассы."""
+
+    name: str
+    span_id: str
+    parent_id: str | None
+    start_offset_ms: float
+    duration_ms: float
+    status: str
+    attributes: dict[str, str | int | float | bool | None]
+
+
+class TraceView(BaseModel):
+    """Трасса одного запроса: все стадии и их вложенность."""
+
+    trace_id: str
+    duration_ms: float
+    spans: list[SpanView]
+
+
+class PoolStatus(BaseModel):
+    """Метрики пула заранее сгенерированных раундов."""
+
+    enabled: bool
+    hits: int
+    misses: int
+    hit_ratio: float
+    refills: int
+    refill_failures: int
+    expired: int
+    ready: dict[str, int]
+
+
+class HostHealthView(BaseModel):
+    """Состояние хоста в трекере здоровья хостов."""
+
+    host: str
+    state: str
+    requests: int
+    failures: int
+    error_rate: float
+    latency_ms: float | None
+    consecutive_failures: int
+    retry_in_s: float
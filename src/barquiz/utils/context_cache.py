@@ -0,0 +1,95 @@
+from contextlib import closing
+from dataclasses import dataclass
+from time import time
+from typing import Final
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.models import DataGatheringResult
+from barquiz.utils.sqlite_store import SQLiteStore
+
+logger = structlog.get_logger(__name__)
+
+SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS context_cache (
+    topic_key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+@dataclass(slots=True)
+class CachedContext:
+    """Запись кэша контекста вместе с её возрастом."""
+
+    result: DataGatheringResult
+    age_s: float
+
+
+class ContextCache:
+    """Персистентный кэш `DataGatheringResult` в SQLite с TTL и LRU-вытеснением.
+
+    Недоступный файл кэша не ломает сбор контекста: чтение считается промахом, запись пропускается.
+    """
+
+    def __init__(self, store: SQLiteStore) -> None:
+        self._store = store
+
+    async def get(self, key: str) -> CachedContext | None:
+        """Возвращает запись по ключу темы независимо от её свежести.
+
+        Args:
+            key: Нормализованный ключ темы.
+
+        Returns:
+            Запись с возрастом в секундах или None, если темы нет в кэше или кэш недоступен.
+        """
+        return await self._store.run(self._get_sync, key, default=None)
+
+    async def put(self, key: str, result: DataGatheringResult) -> None:
+        """Сохраняет результат и вытесняет самые давно использованные записи сверх лимита.
+
+        Args:
+            key: Нормализованный ключ темы.
+            result: Собранный контекст.
+        """
+        await self._store.run(self._put_sync, key, result, default=None)
+
+    def _get_sync(self, key: str) -> CachedContext | None:
+        now = time()
+        with closing(self._store.connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT payload, created_at FROM context_cache WHERE topic_key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE context_cache SET accessed_at = ? WHERE topic_key = ?", (now, key))
+
+        payload, created_at = row
+        return CachedContext(result=DataGatheringResult.model_validate_json(payload), age_s=now - created_at)
+
+    def _put_sync(self, key: str, result: DataGatheringResult) -> None:
+        now = time()
+        with closing(self._store.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO context_cache (topic_key, payload, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, result.model_dump_json(), now, now),
+            )
+            evicted = connection.execute(
+                "DELETE FROM context_cache WHERE topic_key NOT IN "
+                "(SELECT topic_key FROM context_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (settings.CONTEXT_CACHE_MAX_ENTRIES,),
+            ).rowcount
+
+        if evicted:
+            logger.info("context_cache.evicted", entries=evicted)
+
+
+context_cache = ContextCache(
+    SQLiteStore("context_cache", settings.cache_path(settings.CONTEXT_CACHE_PATH), schema=(SCHEMA,))
+)
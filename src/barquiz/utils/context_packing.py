@@ -0,0 +1,146 @@
+import hashlib
+import math
+import re
+import struct
+from dataclasses import dataclass
+from typing import Final
+
+from barquiz.utils.extractors import MIN_PARAGRAPH_LENGTH, TITLE_KEYWORDS, extract_terms
+
+# Токенайзер qwen2.5 в среднем укладывает около трёх символов русского текста в токен.
+CHARS_PER_TOKEN: Final[float] = 3.0
+# Русские слова сравниваются по началу, чтобы «коктейли» и «коктейлей» совпадали.
+STEM_LENGTH: Final[int] = 5
+SHINGLE_SIZE: Final[int] = 3
+MINHASH_BANDS: Final[int] = 8
+MINHASH_ROWS: Final[int] = 4
+NEAR_DUPLICATE_SIMILARITY: Final[float] = 0.8
+TOPIC_TERM_WEIGHT: Final[float] = 2.0
+KEYWORD_WEIGHT: Final[float] = 1.0
+
+# Каждый дайджест blake2b (64 байта) даёт 16 независимых 32-битных хешей шингла; дайджесты с разной
+# солью дают следующие. Маски вида min(x ^ mask) для этого не годятся: почти для всех масок минимум даёт
+# один и тот же шингл, и оценка сходства вырождается в 0 или 1.
+_DIGEST_HASHES: Final[struct.Struct] = struct.Struct("<16I")
+_MINHASH_SALTS: Final[tuple[bytes, ...]] = tuple(
+    index.to_bytes(16, "little") for index in range(math.ceil(MINHASH_BANDS * MINHASH_ROWS / 16))
+)
+_WORD_RE: Final[re.Pattern[str]] = re.compile(r"\w+")
+
+
+@dataclass(slots=True)
+class PackedContext:
+    """Контекст, упакованный в бюджет токенов, и статистика упаковки."""
+
+    text: str
+    paragraphs: int
+    duplicates: int
+    packed: int
+    estimated_tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубо оценивает число токенов в тексте по числу символов."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_context(text: str, topic: str, max_tokens: int) -> PackedContext:
+    """Отбирает самые полезные абзацы собранного контекста в пределах бюджета токенов.
+
+    Текст режется на абзацы, почти одинаковые абзацы (с разных страниц или повторы внутри одной)
+    отбрасываются по MinHash-подписям шинглов, оставшиеся ранжируются по совпадениям с темой и
+    барными ключевыми словами с поправкой на длину. Лучшие абзацы, влезающие в бюджет, возвращаются
+    в исходном порядке, чтобы текст оставался связным.
+
+    Args:
+        text: Собранный контекст (абзацы разделены переводами строк).
+        topic: Тема раунда.
+        max_tokens: Бюджет контекста в токенах.
+
+    Returns:
+        Упакованный текст и статистика.
+    """
+    paragraphs = [line.strip() for line in text.splitlines() if len(line.strip()) >= MIN_PARAGRAPH_LENGTH]
+    unique = _drop_near_duplicates(paragraphs)
+
+    topic_stems = {_stem(term) for term in extract_terms(topic)}
+    ranked = sorted(
+        range(len(unique)),
+        key=lambda index: _score(unique[index], topic_stems),
+        reverse=True,
+    )
+
+    selected: list[int] = []
+    budget_left = max_tokens
+    for index in ranked:
+        cost = estimate_tokens(unique[index]) + 1
+        if cost <= budget_left:
+            selected.append(index)
+            budget_left -= cost
+
+    packed_text = "\n".join(unique[index] for index in sorted(selected))
+    return PackedContext(
+        text=packed_text,
+        paragraphs=len(paragraphs),
+        duplicates=len(paragraphs) - len(unique),
+        packed=len(selected),
+        estimated_tokens=estimate_tokens(packed_text),
+    )
+
+
+def _stem(word: str) -> str:
+    return word[:STEM_LENGTH]
+
+
+def _score(paragraph: str, topic_stems: set[str]) -> float:
+    stems = {_stem(term) for term in extract_terms(paragraph)}
+    if not stems:
+        return 0.0
+
+    topic_hits = len(stems & topic_stems)
+    keyword_hits = sum(1 for keyword in TITLE_KEYWORDS if any(stem.startswith(keyword) for stem in stems))
+    # Делим на корень из длины: короткий абзац с одним совпадением не должен обгонять плотный длинный.
+    return (TOPIC_TERM_WEIGHT * topic_hits + KEYWORD_WEIGHT * keyword_hits) / math.sqrt(len(stems))
+
+
+def _drop_near_duplicates(paragraphs: list[str]) -> list[str]:
+    unique: list[str] = []
+    signatures: list[tuple[int, ...]] = []
+    buckets: dict[tuple[int, tuple[int, ...]], list[int]] = {}
+
+    for paragraph in paragraphs:
+        signature = _minhash(paragraph)
+        bands = [
+            (band, signature[band * MINHASH_ROWS : (band + 1) * MINHASH_ROWS]) for band in range(MINHASH_BANDS)
+        ]
+        candidates = {index for key in bands for index in buckets.get(key, ())}
+        if any(_similarity(signature, signatures[index]) >= NEAR_DUPLICATE_SIMILARITY for index in candidates):
+            continue
+
+        for key in bands:
+            buckets.setdefault(key, []).append(len(unique))
+        unique.append(paragraph)
+        signatures.append(signature)
+
+    return unique
+
+
+def _minhash(paragraph: str) -> tuple[int, ...]:
+    words = _WORD_RE.findall(paragraph.lower())
+    offsets = range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    shingles = {" ".join(words[offset : offset + SHINGLE_SIZE]) for offset in offsets}
+    # blake2b, а не hash(): тот рандомизируется в каждом процессе, и подписи не совпадали бы между запусками.
+    hashes = [_shingle_hashes(shingle.encode()) for shingle in shingles]
+    return tuple(map(min, zip(*hashes)))[: MINHASH_BANDS * MINHASH_ROWS]
+
+
+def _shingle_hashes(shingle: bytes) -> tuple[int, ...]:
+    return tuple(
+        value
+        for salt in _MINHASH_SALTS
+        for value in _DIGEST_HASHES.unpack(hashlib.blake2b(shingle, digest_size=64, salt=salt).digest())
+    )
+
+
+def _similarity(left: tuple[int, ...], right: tuple[int, ...]) -> float:
+    return sum(a == b for a, b in zip(left, right)) / len(left)
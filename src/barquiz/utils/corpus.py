@@ -0,0 +1,161 @@
+import hashlib
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from typing import Final
+
+import structlog
+
+from barquiz.models import DataGatheringResult
+
+logger = structlog.get_logger(__name__)
+
+MAGIC: Final[bytes] = b"BQCORPUS"
+VERSION: Final[int] = 1
+COMPRESSION_LEVEL: Final[int] = 9
+# Заголовок: сигнатура, версия, резерв, число корзин хеш-таблицы, число записей.
+HEADER: Final[struct.Struct] = struct.Struct("<8sHHII")
+# Корзина хеш-таблицы: хеш ключа (0 — пустая), смещение и длина сжатой записи.
+BUCKET: Final[struct.Struct] = struct.Struct("<QQI")
+
+
+class CorpusFormatError(ValueError):
+    """Файл не похож на корпус BarQuiz или записан несовместимой версией."""
+
+
+def _key_hash(key: str) -> int:
+    digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+    return digest or 1
+
+
+def write_corpus(path: Path, entries: dict[str, DataGatheringResult]) -> int:
+    """Записывает корпус контекстов: хеш-таблицу с открытой адресацией и сжатые zlib записи за ней.
+
+    Файл пишется во временный и атомарно подменяет старый, чтобы работающий сервис не прочитал его
+    наполовину записанным.
+
+    Args:
+        path: Куда записать корпус.
+        entries: Результаты сбора по нормализованным ключам тем.
+
+    Returns:
+        Размер файла в байтах.
+    """
+    bucket_count = 1
+    while bucket_count < 2 * max(len(entries), 1):
+        bucket_count *= 2
+
+    payloads = [
+        (key, zlib.compress(result.model_dump_json().encode(), COMPRESSION_LEVEL)) for key, result in entries.items()
+    ]
+    buckets = [(0, 0, 0)] * bucket_count
+    offset = HEADER.size + BUCKET.size * bucket_count
+    for key, payload in payloads:
+        key_hash = _key_hash(key)
+        index = key_hash & (bucket_count - 1)
+        while buckets[index][0]:
+            index = (index + 1) & (bucket_count - 1)
+        buckets[index] = (key_hash, offset, len(payload))
+        offset += len(payload)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(f"{path.suffix}.tmp")
+    with temporary.open("wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, bucket_count, len(payloads)))
+        for bucket in buckets:
+            file.write(BUCKET.pack(*bucket))
+        for _, payload in payloads:
+            file.write(payload)
+    temporary.replace(path)
+    return offset
+
+
+class Corpus:
+    """Корпус контекстов, отображённый в память: при открытии читается только заголовок.
+
+    Поиск темы — хеш ключа и линейное пробирование таблицы корзин, то есть O(1) в среднем; с диска
+    подтягиваются только страницы нужной корзины и записи.
+    """
+
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise CorpusFormatError(f"{path} is too short to be a corpus")
+
+        magic, version, _, self._bucket_count, self._entries = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise CorpusFormatError(f"{path} is not a version {VERSION} corpus")
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def get(self, key: str) -> DataGatheringResult | None:
+        """Возвращает контекст по нормализованному ключу темы.
+
+        Args:
+            key: Нормализованный ключ темы.
+
+        Returns:
+            Сохранённый результат сбора или None, если темы нет в корпусе.
+        """
+        key_hash = _key_hash(key)
+        index = key_hash & (self._bucket_count - 1)
+        for _ in range(self._bucket_count):
+            stored_hash, offset, length = BUCKET.unpack_from(self._map, HEADER.size + BUCKET.size * index)
+            if not stored_hash:
+                return None
+            if stored_hash == key_hash:
+                return DataGatheringResult.model_validate_json(zlib.decompress(self._map[offset : offset + length]))
+            index = (index + 1) & (self._bucket_count - 1)
+        return None
+
+    def close(self) -> None:
+        """Снимает отображение файла."""
+        self._map.close()
+
+
+_corpus: Corpus | None = None
+# Путь и mtime файла, из которого открыт `_corpus`; mtime None — файла не было.
+_corpus_stamp: tuple[Path, int | None] | None = None
+
+
+def get_corpus(path: Path | None) -> Corpus | None:
+    """Открывает корпус при первом обращении и дальше возвращает его же, пока файл не изменился.
+
+    Файл, которого не было при первом обращении или который пересобрали после старта, открывается
+    заново по смене mtime, так что свежий снапшот подхватывается без перезапуска сервиса.
+
+    Args:
+        path: Путь к файлу корпуса; None — корпус не настроен.
+
+    Returns:
+        Корпус или None, если путь не задан, файла нет, он пуст или повреждён.
+    """
+    global _corpus, _corpus_stamp
+    if path is None:
+        return None
+
+    try:
+        mtime_ns: int | None = path.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    stamp = (path, mtime_ns)
+    if stamp == _corpus_stamp:
+        return _corpus
+
+    if _corpus is not None:
+        _corpus.close()
+    _corpus, _corpus_stamp = None, stamp
+    try:
+        _corpus = Corpus(path)
+    except (OSError, ValueError) as error:
+        logger.warning("snapshot.unavailable", path=str(path), error=str(error))
+        return None
+
+    logger.info("snapshot.opened", path=str(path), topics=len(_corpus))
+    return _corpus
@@ -0,0 +1,234 @@
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import cache
+from types import MappingProxyType
+from typing import Final, TypeAlias
+
+import structlog
+from bs4 import BeautifulSoup, Tag
+
+from barquiz.config import ExtractorBackend
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml — опциональная зависимость (extra "lxml")
+    etree = None
+    lxml_html = None
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass(slots=True)
+class ExtractedPage:
+    """Заголовок и читаемый текст страницы, извлечённые без привязки к теме."""
+
+    title: str | None
+    text: str
+
+    def text_for(self, topic: str) -> str:
+        """Возвращает текст страницы, если её заголовок релевантен теме, иначе пустую строку."""
+        return self.text if title_seems_relevant(self.title, topic) else ""
+
+
+Extractor: TypeAlias = Callable[[str], ExtractedPage]
+
+REMOVABLE_TAGS: Final[tuple[str, ...]] = (
+    "nav",
+    "header",
+    "footer",
+    "script",
+    "style",
+    "form",
+    "button",
+    "iframe",
+    "noscript",
+)
+CONTENT_TAGS: Final[tuple[str, ...]] = ("h1", "h2", "h3", "h4", "h5", "h6", "p", "li")
+TITLE_KEYWORDS: Final[tuple[str, ...]] = (
+    "бар",
+    "барн",
+    "коктейл",
+    "напит",
+    "алкогол",
+    "вино",
+    "пиво",
+    "ресторан",
+    "паб",
+    "бармен",
+)
+MIN_PARAGRAPH_LENGTH: Final[int] = 30
+# lxml не разбирает str с объявлением кодировки, а текст страницы к этому моменту уже декодирован.
+XML_DECLARATION: Final[re.Pattern[str]] = re.compile(r"^\ufeff?\s*<\?xml[^>]*\?>")
+# html.parser разбирает разметку внутри <title> в теги, а libxml2, как и браузеры, оставляет её текстом.
+TITLE_MARKUP: Final[re.Pattern[str]] = re.compile(r"<[^>]*>")
+
+
+def extract_with_bs4(html: str) -> ExtractedPage:
+    """Извлекает заголовок и читаемый текст страницы через BeautifulSoup и `html.parser`.
+
+    Релевантность теме здесь не проверяется: результат не зависит от темы и может переиспользоваться
+    кэшем страниц, а проверка заголовка делается в `ExtractedPage.text_for`.
+
+    Args:
+        html: HTML страницы.
+
+    Returns:
+        Заголовок и абзацы основного блока страницы.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title = _normalize_title(soup.title.get_text()) if soup.title else None
+
+    for tag in soup.find_all(REMOVABLE_TAGS):
+        tag.decompose()
+
+    container = _pick_main_container(soup)
+    text_parts = []
+
+    for element in container.find_all(CONTENT_TAGS):
+        text = element.get_text(" ", strip=True)
+        if not text:
+            continue
+
+        if element.name == "p" and len(text) < MIN_PARAGRAPH_LENGTH:
+            continue
+
+        text_parts.append(text)
+
+    return ExtractedPage(title=title, text="\n".join(text_parts).strip())
+
+
+def extract_with_lxml(html: str) -> ExtractedPage:
+    """Извлекает тот же текст, что и `extract_with_bs4`, но на C-итераторах lxml.
+
+    Вместо повторных обходов дерева BeautifulSoup шумовые поддеревья очищаются одним проходом
+    `iter(REMOVABLE_TAGS)`, а абзацы собираются одним проходом `iter(CONTENT_TAGS)`.
+
+    Args:
+        html: HTML страницы.
+
+    Returns:
+        Заголовок и абзацы основного блока страницы.
+    """
+    if not html.strip():
+        return ExtractedPage(title=None, text="")
+
+    try:
+        root = lxml_html.document_fromstring(XML_DECLARATION.sub("", html, count=1))
+    except (etree.ParserError, ValueError):
+        return ExtractedPage(title=None, text="")
+
+    title_element = root.find(".//title")
+    title = _normalize_title("".join(title_element.itertext())) if title_element is not None else None
+
+    for element in list(root.iter(*REMOVABLE_TAGS)):
+        # clear вместо drop_tree: хвостовой текст остаётся отдельной строкой, как у BeautifulSoup.decompose.
+        element.clear(keep_tail=True)
+
+    container = _pick_lxml_container(root)
+    text_parts = []
+
+    for element in container.iter(*CONTENT_TAGS):
+        if element is container:
+            continue
+
+        text = " ".join(part.strip() for part in element.itertext() if part.strip())
+        if not text:
+            continue
+
+        if element.tag == "p" and len(text) < MIN_PARAGRAPH_LENGTH:
+            continue
+
+        text_parts.append(text)
+
+    return ExtractedPage(title=title, text="\n".join(text_parts).strip())
+
+
+EXTRACTORS: Final[MappingProxyType[ExtractorBackend, Extractor]] = MappingProxyType(
+    {
+        ExtractorBackend.BS4: extract_with_bs4,
+        ExtractorBackend.LXML: extract_with_lxml,
+    }
+)
+
+
+@cache
+def get_extractor(backend: ExtractorBackend) -> Extractor:
+    """Возвращает функцию извлечения текста для выбранного бэкенда.
+
+    Args:
+        backend: Бэкенд из настроек.
+
+    Returns:
+        Функция `(html) -> ExtractedPage`. Если lxml не установлен, возвращается BeautifulSoup-бэкенд.
+    """
+    if backend == ExtractorBackend.LXML and lxml_html is None:
+        logger.warning("extract.backend_unavailable", backend=backend, fallback=ExtractorBackend.BS4)
+        return extract_with_bs4
+    return EXTRACTORS[backend]
+
+
+def _normalize_title(raw: str) -> str | None:
+    # Одно правило для обоих бэкендов: от смены EXTRACTOR_BACKEND не должно меняться, какие страницы
+    # `ExtractedPage.text_for` считает релевантными.
+    title = " ".join(TITLE_MARKUP.sub("", raw).split())
+    return title or None
+
+
+def _pick_main_container(soup: BeautifulSoup) -> Tag:
+    for candidate in (
+        soup.find("main"),
+        soup.find(attrs={"role": "main"}),
+        soup.find("article"),
+    ):
+        if isinstance(candidate, Tag):
+            return candidate
+
+    if soup.body:
+        return soup.body
+
+    return soup
+
+
+def _pick_lxml_container(root: "etree._Element") -> "etree._Element":
+    for xpath in ("//main", "//*[@role='main']", "//article", "//body"):
+        found = root.xpath(xpath)
+        if found:
+            return found[0]
+
+    return root
+
+
+def title_seems_relevant(title: str | None, topic: str) -> bool:
+    """Проверяет, что заголовок страницы похож на барную тематику или на тему запроса.
+
+    Args:
+        title: Заголовок страницы.
+        topic: Тема запроса.
+
+    Returns:
+        True, если в заголовке встречается слово темы или барное ключевое слово.
+    """
+    if not title:
+        return False
+
+    lowered_title = title.lower()
+    topic_terms = extract_terms(topic)
+    if any(term in lowered_title for term in topic_terms):
+        return True
+
+    return any(keyword in lowered_title for keyword in TITLE_KEYWORDS)
+
+
+def extract_terms(text: str) -> set[str]:
+    """Разбивает текст на значимые слова длиннее двух букв в нижнем регистре.
+
+    Args:
+        text: Исходный текст.
+
+    Returns:
+        Множество слов.
+    """
+    tokens = re.findall(r"[A-Za-zА-Яа-яёЁ]+", text.lower())
+    return {token for token in tokens if len(token) > 2}
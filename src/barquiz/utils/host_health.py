@@ -0,0 +1,266 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import StrEnum
+from time import monotonic
+from typing import Final
+from urllib.parse import urlparse
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.models import HostHealthView
+from barquiz.utils.metrics import host_circuit_transitions
+
+logger = structlog.get_logger(__name__)
+
+MAX_TRACKED_HOSTS: Final[int] = 5000
+MIN_HEDGE_DELAY_S: Final[float] = 0.2
+LATENCY_SMOOTHING: Final[float] = 0.2
+DEVIATION_SMOOTHING: Final[float] = 0.25
+ERROR_RATE_SMOOTHING: Final[float] = 0.2
+# Статусы, которые говорят о хосте, а не о конкретной странице: антибот, пейвол, лимиты, падения.
+HOST_FAILURE_STATUSES: Final[frozenset[int]] = frozenset({401, 403, 429, 451})
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    BLOCKED = "blocked"
+
+
+@dataclass(slots=True)
+class HostStats:
+    """Скользящая статистика хоста и состояние его предохранителя."""
+
+    latency_ms: float | None = None
+    latency_deviation_ms: float = 0.0
+    error_rate: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    trips: int = 0
+    open_until: float = 0.0
+    blocked_until: float = 0.0
+    probe_until: float = 0.0
+
+
+def host_key(url: str) -> str:
+    """Возвращает хост URL в нижнем регистре и без `www.`."""
+    hostname = (urlparse(url).hostname or "").lower()
+    return hostname.removeprefix("www.")
+
+
+class HostHealthTracker:
+    """Следит за задержками и ошибками хостов и отключает те, что стабильно не отвечают.
+
+    После `HOST_FAILURE_THRESHOLD` неудач подряд предохранитель хоста размыкается на `HOST_COOLDOWN_S`,
+    затем пропускается одна пробная загрузка: успех замыкает его, неудача размыкает снова на вдвое
+    больший срок. Хост, разомкнувшийся `HOST_BLOCKLIST_AFTER_TRIPS` раз без единого успеха, попадает
+    в выученный блок-лист на `HOST_BLOCKLIST_TTL_S`. Медленные хосты и хосты с высокой долей ошибок
+    не отключаются, а уходят в конец выдачи поиска.
+
+    Чтение состояния безопасно из потока поиска: там только смотрят в словарь, меняется он в event loop.
+    """
+
+    def __init__(self) -> None:
+        self._hosts: OrderedDict[str, HostStats] = OrderedDict()
+
+    def state(self, url: str) -> CircuitState:
+        """Возвращает состояние предохранителя хоста URL."""
+        stats = self._hosts.get(host_key(url))
+        if stats is None:
+            return CircuitState.CLOSED
+        return self._state(stats, monotonic())
+
+    def is_usable(self, url: str) -> bool:
+        """Проверяет, что URL стоит брать в выдачу поиска: хост не отключён и не в блок-листе."""
+        if not settings.HOST_HEALTH_ENABLED:
+            return True
+        return self.state(url) in (CircuitState.CLOSED, CircuitState.HALF_OPEN)
+
+    def try_acquire(self, url: str) -> bool:
+        """Решает, можно ли сейчас качать URL.
+
+        Для отключённого хоста после остывания пропускается ровно одна пробная загрузка; пока она
+        идёт (но не дольше `FETCH_TIMEOUT`), остальные URL этого хоста отклоняются.
+
+        Returns:
+            True, если загрузку можно начинать.
+        """
+        if not settings.HOST_HEALTH_ENABLED:
+            return True
+
+        stats = self._hosts.get(host_key(url))
+        if stats is None:
+            return True
+
+        now = monotonic()
+        state = self._state(stats, now)
+        if state is CircuitState.HALF_OPEN and stats.probe_until <= now:
+            stats.probe_until = now + settings.FETCH_TIMEOUT
+            return True
+        return state is CircuitState.CLOSED
+
+    def timeout_s(self, url: str) -> float:
+        """Таймаут загрузки страницы по задержкам хоста: среднее плюс четыре отклонения, как RTO в TCP.
+
+        Returns:
+            Секунды в пределах [`FETCH_MIN_TIMEOUT_S`, `FETCH_TIMEOUT`]; для незнакомого хоста — `FETCH_TIMEOUT`.
+        """
+        expected_ms = self._expected_latency_ms(url, deviations=4)
+        if expected_ms is None:
+            return settings.FETCH_TIMEOUT
+        return min(max(expected_ms / 1000, settings.FETCH_MIN_TIMEOUT_S), settings.FETCH_TIMEOUT)
+
+    def hedge_delay_s(self, url: str) -> float:
+        """Через сколько секунд загрузка с этого хоста считается отстающей и стоит запустить запасную.
+
+        Returns:
+            Среднее плюс два отклонения задержки хоста; для незнакомого хоста — `FETCH_HEDGE_DELAY_S`.
+        """
+        expected_ms = self._expected_latency_ms(url, deviations=2)
+        if expected_ms is None:
+            return settings.FETCH_HEDGE_DELAY_S
+        return min(max(expected_ms / 1000, MIN_HEDGE_DELAY_S), settings.FETCH_TIMEOUT)
+
+    def rank(self, urls: list[str]) -> list[str]:
+        """Переносит URL медленных и часто ошибающихся хостов в конец, сохраняя порядок внутри групп."""
+        if not settings.HOST_HEALTH_ENABLED:
+            return urls
+        return sorted(urls, key=self._is_degraded)
+
+    def record_response(self, url: str, status_code: int, latency_ms: float) -> None:
+        """Учитывает ответ хоста: 5xx и статусы из `HOST_FAILURE_STATUSES` считаются неудачей."""
+        if status_code >= 500 or status_code in HOST_FAILURE_STATUSES:
+            self.record_failure(url, latency_ms, reason=str(status_code))
+        else:
+            self.record_success(url, latency_ms)
+
+    def record_success(self, url: str, latency_ms: float) -> None:
+        """Учитывает успешную загрузку и замыкает предохранитель хоста."""
+        if not settings.HOST_HEALTH_ENABLED:
+            return
+
+        host = host_key(url)
+        stats = self._touch(host, latency_ms, failed=False)
+        was_open = stats.trips > 0
+        stats.consecutive_failures = 0
+        stats.trips = 0
+        stats.open_until = stats.blocked_until = stats.probe_until = 0.0
+        if was_open:
+            host_circuit_transitions.inc(state=CircuitState.CLOSED)
+            logger.info("host.circuit_closed", host=host, latency_ms=latency_ms)
+
+    def record_failure(self, url: str, latency_ms: float, reason: str) -> None:
+        """Учитывает неудачную загрузку и при необходимости размыкает предохранитель хоста."""
+        if not settings.HOST_HEALTH_ENABLED:
+            return
+
+        host = host_key(url)
+        now = monotonic()
+        stats = self._touch(host, latency_ms, failed=True)
+        stats.consecutive_failures += 1
+        stats.probe_until = 0.0
+        probe_failed = stats.trips > 0 and self._state(stats, now) is CircuitState.HALF_OPEN
+        if not probe_failed and (stats.trips > 0 or stats.consecutive_failures < settings.HOST_FAILURE_THRESHOLD):
+            return
+
+        stats.trips += 1
+        if stats.trips >= settings.HOST_BLOCKLIST_AFTER_TRIPS:
+            stats.blocked_until = now + settings.HOST_BLOCKLIST_TTL_S
+            host_circuit_transitions.inc(state=CircuitState.BLOCKED)
+            logger.warning("host.blocklisted", host=host, reason=reason, trips=stats.trips)
+            return
+
+        cooldown_s = settings.HOST_COOLDOWN_S * 2 ** (stats.trips - 1)
+        stats.open_until = now + cooldown_s
+        host_circuit_transitions.inc(state=CircuitState.OPEN)
+        logger.warning(
+            "host.circuit_opened",
+            host=host,
+            reason=reason,
+            consecutive_failures=stats.consecutive_failures,
+            cooldown_s=cooldown_s,
+        )
+
+    def record_abandoned(self, url: str, elapsed_ms: float) -> None:
+        """Учитывает загрузку, отменённую за ненадобностью.
+
+        Это не ошибка хоста, но её время — нижняя оценка задержки: без этого хост, чьи загрузки всегда
+        отменяются по кворуму, так и не попал бы в медленные.
+        """
+        if not settings.HOST_HEALTH_ENABLED:
+            return
+
+        stats = self._stats(host_key(url))
+        if stats.latency_ms is None or elapsed_ms > stats.latency_ms:
+            self._observe_latency(stats, elapsed_ms)
+
+    def snapshot(self) -> list[HostHealthView]:
+        """Возвращает статистику хостов, начиная с отключённых и самых ненадёжных."""
+        now = monotonic()
+        views = [
+            HostHealthView(
+                host=host,
+                state=self._state(stats, now),
+                requests=stats.requests,
+                failures=stats.failures,
+                error_rate=stats.error_rate,
+                latency_ms=stats.latency_ms,
+                consecutive_failures=stats.consecutive_failures,
+                retry_in_s=max(stats.blocked_until, stats.open_until, now) - now,
+            )
+            for host, stats in self._hosts.items()
+        ]
+        return sorted(views, key=lambda view: (view.state == CircuitState.CLOSED, -view.error_rate))
+
+    def _state(self, stats: HostStats, now: float) -> CircuitState:
+        if stats.blocked_until > now:
+            return CircuitState.BLOCKED
+        if stats.open_until > now:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN if stats.trips else CircuitState.CLOSED
+
+    def _is_degraded(self, url: str) -> bool:
+        stats = self._hosts.get(host_key(url))
+        if stats is None:
+            return False
+        slow = stats.latency_ms is not None and stats.latency_ms > settings.HOST_SLOW_MS
+        return slow or stats.error_rate > settings.HOST_DEGRADED_ERROR_RATE
+
+    def _expected_latency_ms(self, url: str, deviations: int) -> float | None:
+        stats = self._hosts.get(host_key(url))
+        if stats is None or stats.latency_ms is None:
+            return None
+        return stats.latency_ms + deviations * stats.latency_deviation_ms
+
+    def _touch(self, host: str, latency_ms: float, failed: bool) -> HostStats:
+        stats = self._stats(host)
+        stats.requests += 1
+        stats.failures += failed
+        stats.error_rate += ERROR_RATE_SMOOTHING * (failed - stats.error_rate)
+        self._observe_latency(stats, latency_ms)
+        return stats
+
+    def _stats(self, host: str) -> HostStats:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats()
+            while len(self._hosts) > MAX_TRACKED_HOSTS:
+                self._hosts.popitem(last=False)
+        self._hosts.move_to_end(host)
+        return stats
+
+    def _observe_latency(self, stats: HostStats, latency_ms: float) -> None:
+        if stats.latency_ms is None:
+            stats.latency_ms = latency_ms
+            stats.latency_deviation_ms = latency_ms / 2
+        else:
+            stats.latency_deviation_ms += DEVIATION_SMOOTHING * (
+                abs(latency_ms - stats.latency_ms) - stats.latency_deviation_ms
+            )
+            stats.latency_ms += LATENCY_SMOOTHING * (latency_ms - stats.latency_ms)
+
+
+host_health = HostHealthTracker()
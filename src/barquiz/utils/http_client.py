@@ -1,83 +1,284 @@
 import asyncio
-import re
-from collections import Counter
-from urllib.parse import unquote
+import math
+import multiprocessing
+from collections import Counter, deque
+from collections.abc import AsyncGenerator, AsyncIterable, AsyncIterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import unquote, urlparse
 from time import perf_counter
-from typing import Final
+from typing import Final, TypeAlias
 
 import httpx
-from bs4 import BeautifulSoup, Tag
 
-from barquiz.config import settings
+from barquiz.config import ExtractExecutor, settings
+from barquiz.utils.extractors import ExtractedPage, get_extractor
+from barquiz.utils.host_health import host_health
+from barquiz.utils.metrics import (
+    extraction_latency,
+    fetch_latency,
+    fetch_status,
+    http_fetch_latency,
+    page_cache_lookups,
+)
+from barquiz.utils.page_cache import CachedPage, page_cache, page_digest
+from barquiz.utils.paragraph_index import paragraph_index
+from barquiz.utils.tracing import span
 
 import structlog
 
 logger = structlog.get_logger(__name__)
 
-REMOVABLE_TAGS: Final[tuple[str, ...]] = (
-    "nav",
-    "header",
-    "footer",
-    "script",
-    "style",
-    "form",
-    "button",
-    "iframe",
-    "noscript",
-)
-CONTENT_TAGS: Final[tuple[str, ...]] = ("h1", "h2", "h3", "h4", "h5", "h6", "p", "li")
-TITLE_KEYWORDS: Final[tuple[str, ...]] = (
-    "бар",
-    "барн",
-    "коктейл",
-    "напит",
-    "алкогол",
-    "вино",
-    "пиво",
-    "ресторан",
-    "паб",
-    "бармен",
-)
-MIN_PARAGRAPH_LENGTH: Final[int] = 30
 MAX_CHUNK_LENGTH: Final[int] = 2000
+HTML_CONTENT_TYPES: Final[tuple[str, ...]] = ("text/html", "application/xhtml+xml")
+
+
+@dataclass(slots=True)
+class FetchedPage:
+    """Результат загрузки одной страницы."""
+
+    url: str
+    status_code: int
+    html: str = ""
+    truncated: bool = False
+    skipped: bool = False
+    etag: str | None = None
+    last_modified: str | None = None
+    cached: bool = False  # текст взят из кэша страниц без разбора HTML
+
+
+@dataclass(slots=True)
+class _HostSlot:
+    """Ограничитель одновременных загрузок с одного хоста и число загрузок, которые его держат или ждут."""
+
+    semaphore: asyncio.Semaphore
+    users: int = 0
+
+
+PageResult: TypeAlias = tuple[FetchedPage | Exception, str, float]
+
+_client: httpx.AsyncClient | None = None
+_host_slots: dict[str, _HostSlot] = {}
+_extract_executor: Executor | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=settings.FETCH_TIMEOUT,
+            follow_redirects=True,
+            http2=settings.HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+            ),
+        )
+    return _client
 
 
-async def fetch_urls(urls: list[str], topic: str) -> tuple[str, float]:
+async def start_http_client() -> None:
+    """Создаёт общий HTTP-клиент с пулом соединений для загрузки страниц."""
+    _get_client()
+    logger.info(
+        "http.client.started",
+        http2=settings.HTTP2_ENABLED,
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_connections_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+    )
+
+
+async def close_http_client() -> None:
+    """Закрывает общий HTTP-клиент и все keep-alive соединения."""
+    global _client
+    if _client is None:
+        return
+
+    await _client.aclose()
+    _client = None
+    _host_slots.clear()
+    logger.info("http.client.closed")
+
+
+def _get_extract_executor() -> Executor:
+    global _extract_executor
+    if _extract_executor is None:
+        if settings.EXTRACT_EXECUTOR == ExtractExecutor.PROCESS:
+            _extract_executor = ProcessPoolExecutor(
+                max_workers=settings.EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            _extract_executor = ThreadPoolExecutor(
+                max_workers=settings.EXTRACT_WORKERS,
+                thread_name_prefix="html-extract",
+            )
+    return _extract_executor
+
+
+async def start_extract_executor() -> None:
+    """Поднимает пул воркеров для разбора HTML вне event loop и прогревает их."""
+    loop = asyncio.get_running_loop()
+    executor = _get_extract_executor()
+    # Процессы стартуют лениво, поэтому прогреваем их пустыми задачами, а не первым запросом.
+    await asyncio.gather(
+        *(loop.run_in_executor(executor, _extract_timed, "") for _ in range(settings.EXTRACT_WORKERS))
+    )
+    logger.info("extract.executor.started", kind=settings.EXTRACT_EXECUTOR, workers=settings.EXTRACT_WORKERS)
+
+
+async def close_extract_executor(wait: bool = False) -> None:
+    """Останавливает пул воркеров разбора HTML.
+
+    Args:
+        wait: Дождаться завершения воркеров. Без этого процессы не успевают завершиться к выходу из
+            функции, и их пиковый RSS не попадает в `RUSAGE_CHILDREN`.
+    """
+    global _extract_executor
+    if _extract_executor is None:
+        return
+
+    executor, _extract_executor = _extract_executor, None
+    if wait:
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+    else:
+        executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("extract.executor.closed", waited=wait)
+
+
+@asynccontextmanager
+async def _host_slot(url: str) -> AsyncIterator[None]:
+    host = (urlparse(url).hostname or "").lower()
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = _HostSlot(semaphore=asyncio.Semaphore(settings.HTTP_MAX_CONNECTIONS_PER_HOST))
+
+    slot.users += 1
+    try:
+        async with slot.semaphore:
+            yield
+    finally:
+        slot.users -= 1
+        # Простаивающий ограничитель не нужен: иначе словарь рос бы на каждый хост, с которого хоть раз качали.
+        if not slot.users and _host_slots.get(host) is slot:
+            del _host_slots[host]
+
+
+async def fetch_urls(
+    urls: list[str] | AsyncIterable[str],
+    topic: str,
+    target_chars: int | None = None,
+    quorum: int | None = None,
+) -> tuple[str, float]:
     """Скачивает контент параллельно и возвращает очищенный текст.
 
+    Загрузка страницы стартует, как только появляется её URL и есть свободный слот, а текст собирается в
+    порядке завершения загрузок. Загрузка дольше обычного для своего хоста (`HostHealthTracker.hedge_delay_s`)
+    уступает слот запасному URL, но не отменяется: какая из них придёт первой, ту и берём. Сбор
+    заканчивается, как только набрано `target_chars` символов или `quorum` страниц с текстом, либо
+    исчерпан бюджет `FETCH_BUDGET_S` от первого URL; оставшиеся загрузки отменяются. URL хостов, отключённых трекером
+    здоровья, пропускаются без запроса.
+
     Args:
-        urls: Список URL-адресов для загрузки.
+        urls: Список URL-адресов или асинхронный поток URL (например, прямо из поиска).
         topic: Тема запроса для проверки релевантности.
+        target_chars: Сколько символов контекста достаточно; None — без ограничения.
+        quorum: Сколько страниц с текстом достаточно; столько же загрузок идут одновременно.
+            None — качать все URL сразу.
 
     Returns:
         Кортеж из очищенного текста из успешно загруженных страниц и времени загрузки в мс.
     """
     started = perf_counter()
-    async with httpx.AsyncClient(timeout=settings.FETCH_TIMEOUT, follow_redirects=True) as client:
-        tasks = [_fetch_single_url(client, url) for url in urls]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
+    loop = asyncio.get_running_loop()
+    # Бюджет отсчитывается от первого URL, чтобы медленный поиск не съедал время загрузок.
+    deadline = math.inf
+    client = _get_client()
+    url_iterator = aiter(urls) if isinstance(urls, AsyncIterable) else aiter(_iter_urls(host_health.rank(urls)))
+    next_url: asyncio.Task[str] | None = asyncio.ensure_future(anext(url_iterator))
+    spares: deque[str] = deque()
+    # Момент, после которого загрузка считается отстающей и перестаёт занимать слот.
+    lagging_at: dict[asyncio.Task[PageResult], float] = {}
+
+    urls_count = 0
+    hedged = 0
+    text_length = 0
     full_text: list[str] = []
+    extract_ms: list[float] = []
     status_buckets: Counter[str] = Counter()
-    for response in responses:
-        if not isinstance(response, httpx.Response):
-            status_buckets["failed"] += 1
-            continue
-
-        if response.status_code != httpx.codes.OK:
-            status_buckets[f"{response.status_code//100}xx"] += 1
-            continue
-
-        status_buckets[f"{response.status_code//100}xx"] += 1
-        cleaned_text = _extract_readable_text(response.text, topic)
-        if cleaned_text:
-            full_text.append(cleaned_text[:MAX_CHUNK_LENGTH])
+    budget_exhausted = False
+    try:
+        while next_url or lagging_at or spares:
+            if (target_chars is not None and text_length >= target_chars) or (
+                quorum is not None and len(full_text) >= quorum
+            ):
+                break
+
+            now = loop.time()
+            if now >= deadline:
+                budget_exhausted = True
+                break
+
+            active = sum(1 for lag_at in lagging_at.values() if lag_at > now)
+            while spares and (quorum is None or active < quorum):
+                url = spares.popleft()
+                hedged += len(lagging_at) > active
+                task = asyncio.create_task(_fetch_and_extract(client, url, topic))
+                lagging_at[task] = now + host_health.hedge_delay_s(url)
+                active += 1
+
+            waiting = set(lagging_at) | ({next_url} if next_url else set())
+            if not waiting:
+                continue
+
+            wake_at = min([deadline, *(lag_at for lag_at in lagging_at.values() if lag_at > now)])
+            timeout_s = None if wake_at == math.inf else wake_at - now
+            done, _ = await asyncio.wait(waiting, timeout=timeout_s, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is next_url:
+                    try:
+                        url = next_url.result()
+                    except StopAsyncIteration:
+                        next_url = None
+                        continue
+                    urls_count += 1
+                    deadline = min(deadline, loop.time() + settings.FETCH_BUDGET_S)
+                    next_url = asyncio.ensure_future(anext(url_iterator))
+                    if not host_health.try_acquire(url):
+                        status_buckets["circuit_open"] += 1
+                        continue
+                    spares.append(url)
+                    continue
+
+                del lagging_at[task]
+                page, cleaned_text, latency_ms = task.result()
+                _count_status(status_buckets, page)
+                if isinstance(page, FetchedPage) and page.html and not page.cached:
+                    extract_ms.append(latency_ms)
+                if cleaned_text:
+                    full_text.append(cleaned_text[:MAX_CHUNK_LENGTH])
+                    text_length += len(full_text[-1]) + 2
+    finally:
+        cancelled = len(lagging_at)
+        unfinished = [*lagging_at, *([next_url] if next_url else [])]
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        if isinstance(url_iterator, AsyncGenerator):
+            await url_iterator.aclose()
 
     elapsed_ms = (perf_counter() - started) * 1000
     combined_text = "\n\n".join(full_text)
+    fetch_latency.observe_ms(elapsed_ms)
+    for status, count in status_buckets.items():
+        fetch_status.inc(count, status=status)
+    if budget_exhausted:
+        logger.warning("fetch.budget_exhausted", budget_s=settings.FETCH_BUDGET_S, pages_used=len(full_text))
     logger.info(
         "fetch.completed",
-        urls_count=len(urls),
+        urls_count=urls_count,
         pages_used=len(full_text),
         network_latency_download_ms=elapsed_ms,
         text_length=len(combined_text),
@@ -86,77 +287,170 @@ async def fetch_urls(urls: list[str], topic: str) -> tuple[str, float]:
         client_errors=status_buckets.get("4xx", 0),
         server_errors=status_buckets.get("5xx", 0),
         failed=status_buckets.get("failed", 0),
+        skipped=status_buckets.get("skipped", 0),
+        truncated=status_buckets.get("truncated", 0),
+        cached=status_buckets.get("cached", 0),
+        circuit_open=status_buckets.get("circuit_open", 0),
+        hedged=hedged,
+        spares_unused=len(spares),
+        cancelled=cancelled,
+        budget_exhausted=budget_exhausted,
+        extract_ms=extract_ms,
+        extract_ms_max=max(extract_ms, default=0.0),
     )
 
     return combined_text, elapsed_ms
 
 
-async def _fetch_single_url(client: httpx.AsyncClient, url: str) -> httpx.Response | Exception:
-    started = perf_counter()
-    readable_url = unquote(url)
-    try:
-        response = await client.get(url)
-        latency_ms = (perf_counter() - started) * 1000
-        logger.info("http.fetched", url=readable_url, status=response.status_code, latency_ms=latency_ms)
-        return response
-    except Exception as exc:
-        latency_ms = (perf_counter() - started) * 1000
-        error_msg = str(exc) or repr(exc)
-        logger.warning("http.fetch_failed", url=readable_url, error=error_msg, latency_ms=latency_ms)
-        return exc
+async def _iter_urls(urls: list[str]) -> AsyncIterator[str]:
+    for url in urls:
+        yield url
+
+
+def _count_status(status_buckets: Counter[str], page: FetchedPage | Exception) -> None:
+    if not isinstance(page, FetchedPage):
+        status_buckets["failed"] += 1
+        return
+
+    if page.skipped:
+        status_buckets["skipped"] += 1
+        return
 
+    status_buckets[f"{page.status_code//100}xx"] += 1
+    if page.truncated:
+        status_buckets["truncated"] += 1
+    if page.cached:
+        status_buckets["cached"] += 1
 
-def _extract_readable_text(html: str, topic: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    if not _title_seems_relevant(soup.title.string if soup.title else None, topic):
-        return ""
 
-    for tag in soup.find_all(REMOVABLE_TAGS):
-        tag.decompose()
+async def _fetch_and_extract(client: httpx.AsyncClient, url: str, topic: str) -> PageResult:
+    page, cleaned_text, latency_ms = await _fetch_and_extract_page(client, url, topic)
+    if cleaned_text and settings.INDEX_ENABLED:
+        # Всё, что пошло в контекст, попадает и в локальный индекс: по нему отвечаются похожие темы.
+        await paragraph_index.add(url, cleaned_text)
+    return page, cleaned_text, latency_ms
 
-    container = _pick_main_container(soup)
-    text_parts = []
 
-    for element in container.find_all(CONTENT_TAGS):
-        text = element.get_text(" ", strip=True)
-        if not text:
-            continue
+async def _fetch_and_extract_page(client: httpx.AsyncClient, url: str, topic: str) -> PageResult:
+    cached = await page_cache.get(url) if settings.PAGE_CACHE_ENABLED else None
+    page = await _fetch_single_url(client, url, cached)
+    if not isinstance(page, FetchedPage):
+        return page, "", 0.0
 
-        if element.name == "p" and len(text) < MIN_PARAGRAPH_LENGTH:
-            continue
+    if cached is not None and page.status_code == httpx.codes.NOT_MODIFIED:
+        return _reuse_cached(page, cached, topic, "revalidated"), cached.page.text_for(topic), 0.0
 
-        text_parts.append(text)
+    if not page.html:
+        return page, "", 0.0
 
-    return "\n".join(text_parts).strip()
+    digest = page_digest(page.html)
+    if cached is not None and cached.digest == digest:
+        # Сервер не поддерживает валидаторы, но содержимое то же: разбирать HTML заново незачем.
+        await page_cache.put(url, cached.page, digest, page.etag, page.last_modified)
+        return _reuse_cached(page, cached, topic, "unchanged"), cached.page.text_for(topic), 0.0
 
+    loop = asyncio.get_running_loop()
+    with span("extract_readable_text", url=unquote(url), backend=settings.EXTRACTOR_BACKEND) as extract_span:
+        extracted, latency_ms = await loop.run_in_executor(_get_extract_executor(), _extract_timed, page.html)
+        extract_span.set(worker_ms=latency_ms, text_length=len(extracted.text))
+    extraction_latency.observe_ms(latency_ms)
+    if settings.PAGE_CACHE_ENABLED:
+        await page_cache.put(url, extracted, digest, page.etag, page.last_modified)
+        page_cache_lookups.inc(result="miss" if cached is None else "changed")
+    return page, extracted.text_for(topic), latency_ms
 
-def _pick_main_container(soup: BeautifulSoup) -> Tag:
-    for candidate in (
-        soup.find("main"),
-        soup.find(attrs={"role": "main"}),
-        soup.find("article"),
-    ):
-        if isinstance(candidate, Tag):
-            return candidate
 
-    if soup.body:
-        return soup.body
+def _reuse_cached(page: FetchedPage, cached: CachedPage, topic: str, result: str) -> FetchedPage:
+    page.cached = True
+    page_cache_lookups.inc(result=result)
+    logger.debug("page_cache.hit", url=unquote(page.url), result=result, text_length=len(cached.page.text))
+    return page
 
-    return soup
 
+async def _fetch_single_url(
+    client: httpx.AsyncClient,
+    url: str,
+    cached: CachedPage | None = None,
+) -> FetchedPage | Exception:
+    """Скачивает страницу потоково: отбрасывает не-HTML по заголовкам и читает не больше `FETCH_MAX_BYTES`.
 
-def _title_seems_relevant(title: str | None, topic: str) -> bool:
-    if not title:
-        return False
+    Если страница есть в кэше, запрос делается условным, и неизменившаяся страница приходит как 304 без тела.
+    Таймаут всей загрузки выводится из задержек хоста (`HostHealthTracker.timeout_s`).
+    """
+    started = perf_counter()
+    readable_url = unquote(url)
+    timeout_s = host_health.timeout_s(url)
+    try:
+        headers = cached.conditional_headers() if cached is not None else None
+        with span("http.fetch", url=readable_url, conditional=bool(headers), timeout_s=timeout_s) as fetch_span:
+            async with (
+                asyncio.timeout(timeout_s),
+                _host_slot(url),
+                client.stream("GET", url, headers=headers) as response,
+            ):
+                page = await _read_page(response, url)
+            fetch_span.set(status_code=page.status_code, html_length=len(page.html), skipped=page.skipped)
+    except asyncio.CancelledError:
+        host_health.record_abandoned(url, (perf_counter() - started) * 1000)
+        raise
+    except Exception as exc:
+        latency_ms = (perf_counter() - started) * 1000
+        error_msg = str(exc) or repr(exc)
+        logger.warning("http.fetch_failed", url=readable_url, error=error_msg, latency_ms=latency_ms)
+        http_fetch_latency.observe_ms(latency_ms)
+        host_health.record_failure(url, latency_ms, reason=type(exc).__name__)
+        return exc
+
+    latency_ms = (perf_counter() - started) * 1000
+    http_fetch_latency.observe_ms(latency_ms)
+    host_health.record_response(url, page.status_code, latency_ms)
+    logger.info(
+        "http.fetched",
+        url=readable_url,
+        status=page.status_code,
+        latency_ms=latency_ms,
+        html_length=len(page.html),
+        truncated=page.truncated,
+        skipped=page.skipped,
+    )
+    return page
+
+
+async def _read_page(response: httpx.Response, url: str) -> FetchedPage:
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+    if response.status_code != httpx.codes.OK:
+        return FetchedPage(url=url, status_code=response.status_code, etag=etag, last_modified=last_modified)
+
+    content_type = response.headers.get("content-type", "").lower()
+    if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+        return FetchedPage(url=url, status_code=response.status_code, skipped=True)
+
+    body = bytearray()
+    truncated = False
+    async for chunk in response.aiter_bytes():
+        body.extend(chunk)
+        if len(body) >= settings.FETCH_MAX_BYTES:
+            # Дальше читать незачем: из страницы всё равно берём не больше MAX_CHUNK_LENGTH символов.
+            truncated = True
+            break
+
+    html = bytes(body[: settings.FETCH_MAX_BYTES]).decode(response.encoding or "utf-8", errors="replace")
+    return FetchedPage(
+        url=url,
+        status_code=response.status_code,
+        html=html,
+        truncated=truncated,
+        etag=etag,
+        last_modified=last_modified,
+    )
 
-    lowered_title = title.lower()
-    topic_terms = _extract_terms(topic)
-    if any(term in lowered_title for term in topic_terms):
-        return True
 
-    return any(keyword in lowered_title for keyword in TITLE_KEYWORDS)
+def _extract_timed(html: str) -> tuple[ExtractedPage, float]:
+    started = perf_counter()
+    extracted = _extract_readable_text(html)
+    return extracted, (perf_counter() - started) * 1000
 
 
-def _extract_terms(text: str) -> set[str]:
-    tokens = re.findall(r"[A-Za-zА-Яа-яёЁ]+", text.lower())
-    return {token for token in tokens if len(token) > 2}
+def _extract_readable_text(html: str) -> ExtractedPage:
+    return get_extractor(settings.EXTRACTOR_BACKEND)(html)
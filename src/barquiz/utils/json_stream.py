@@ -0,0 +1,74 @@
+import json
+from typing import Any
+
+
+class JsonArrayItemParser:
+    """Инкрементальный парсер, который достаёт объекты-элементы массивов из потока JSON-токенов.
+
+    Подходит и для `{"data": [{...}, {...}]}`, и для голого списка `[{...}, {...}]`: каждый объект,
+    лежащий непосредственно в массиве, отдаётся, как только закрывается его фигурная скобка.
+    """
+
+    def __init__(self) -> None:
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._current: list[str] | None = None
+        self._item_depth = 0
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        """Обрабатывает очередной кусок текста.
+
+        Args:
+            chunk: Фрагмент ответа модели.
+
+        Returns:
+            Объекты, которые полностью закрылись внутри этого фрагмента.
+        """
+        items: list[dict[str, Any]] = []
+        for char in chunk:
+            if self._current is not None:
+                self._current.append(char)
+
+            if self._in_string:
+                self._consume_string_char(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._open(char)
+            elif char in "}]":
+                item = self._close()
+                if item is not None:
+                    items.append(item)
+        return items
+
+    def _consume_string_char(self, char: str) -> None:
+        if self._escaped:
+            self._escaped = False
+        elif char == "\\":
+            self._escaped = True
+        elif char == '"':
+            self._in_string = False
+
+    def _open(self, char: str) -> None:
+        if char == "{" and self._current is None and self._stack and self._stack[-1] == "[":
+            self._current = [char]
+            self._item_depth = len(self._stack)
+        self._stack.append(char)
+
+    def _close(self) -> dict[str, Any] | None:
+        if self._stack:
+            self._stack.pop()
+
+        if self._current is None or len(self._stack) != self._item_depth:
+            return None
+
+        raw_item = "".join(self._current)
+        self._current = None
+        try:
+            parsed = json.loads(raw_item)
+        except json.JSONDecodeError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
@@ -0,0 +1,245 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import ClassVar, Final, TypeAlias
+
+LabelValues: TypeAlias = tuple[str, ...]
+
+LATENCY_BUCKETS_S: Final[tuple[float, ...]] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return f"{{{','.join(pairs)}}}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metric(ABC):
+    """Базовая метрика с именем, описанием и фиксированным набором меток.
+
+    Метрики обновляются только из event loop, поэтому обходятся без блокировок.
+    """
+
+    kind: ClassVar[str] = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Metric {self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> list[str]:
+        """Возвращает строки метрики в текстовом формате Prometheus."""
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """Возвращает строки значений метрики без заголовков HELP и TYPE."""
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    kind: ClassVar[str] = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Увеличивает счётчик.
+
+        Args:
+            amount: Неотрицательное приращение.
+            **labels: Значения меток.
+        """
+        if amount < 0:
+            raise ValueError("Counter can only be incremented by a non-negative amount")
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и убывать."""
+
+    kind: ClassVar[str] = "gauge"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        """Устанавливает значение."""
+        self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Увеличивает значение."""
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Уменьшает значение."""
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels: str) -> Iterator[None]:
+        """Увеличивает значение на время блока `with`."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными бакетами, по которой Prometheus считает p95/p99."""
+
+    kind: ClassVar[str] = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS_S,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Добавляет наблюдение.
+
+        Args:
+            value: Наблюдаемое значение (для латентностей — в секундах).
+            **labels: Значения меток.
+        """
+        key = self._label_values(labels)
+        counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def observe_ms(self, value_ms: float, **labels: str) -> None:
+        """Добавляет наблюдение, измеренное в миллисекундах, переводя его в секунды."""
+        self.observe(value_ms / 1000, **labels)
+
+    def _samples(self) -> list[str]:
+        lines: list[str] = []
+        for key, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(self._sums[key])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса с рендером в текстовый формат Prometheus."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        """Регистрирует метрику и возвращает её же.
+
+        Raises:
+            ValueError: Метрика с таким именем уже зарегистрирована.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_latency = registry.register(
+    Histogram("barquiz_request_duration_seconds", "Total HTTP request time.", labels=("path", "status"))
+)
+requests_in_flight = registry.register(Gauge("barquiz_requests_in_flight", "HTTP requests currently being served."))
+search_latency = registry.register(Histogram("barquiz_search_duration_seconds", "DuckDuckGo search time."))
+fetch_latency = registry.register(Histogram("barquiz_fetch_duration_seconds", "Page fetch stage time per round."))
+http_fetch_latency = registry.register(Histogram("barquiz_http_fetch_duration_seconds", "Single page download time."))
+extraction_latency = registry.register(
+    Histogram("barquiz_extraction_duration_seconds", "HTML to text extraction time per page.")
+)
+llm_latency = registry.register(
+    Histogram("barquiz_llm_duration_seconds", "Ollama inference time by model state.", labels=("mode", "start"))
+)
+llm_prompt_eval_latency = registry.register(
+    Histogram("barquiz_llm_prompt_eval_duration_seconds", "Ollama prompt evaluation time.", labels=("mode",))
+)
+llm_load_latency = registry.register(
+    Histogram("barquiz_llm_load_duration_seconds", "Time Ollama spent loading the model.", labels=("reason",))
+)
+fetch_status = registry.register(
+    Counter("barquiz_fetch_pages_total", "Fetched pages by status bucket.", labels=("status",))
+)
+page_cache_lookups = registry.register(
+    Counter("barquiz_page_cache_lookups_total", "Page cache outcomes per fetched page.", labels=("result",))
+)
+host_circuit_transitions = registry.register(
+    Counter("barquiz_host_circuit_transitions_total", "Host circuit breaker transitions.", labels=("state",))
+)
+gather_coalesced = registry.register(
+    Counter("barquiz_gather_coalesced_total", "Context gathers served by an in-flight gather for the same topic.")
+)
+generator_fallbacks = registry.register(
+    Counter("barquiz_generator_fallbacks_total", "Rounds generated without search context.")
+)
+admission_wait_latency = registry.register(
+    Histogram("barquiz_admission_wait_seconds", "Time a round waited for admission.", labels=("priority",))
+)
+admission_queue_depth = registry.register(Gauge("barquiz_admission_queue_depth", "Rounds waiting for admission."))
+admission_rejected = registry.register(
+    Counter("barquiz_admission_rejected_total", "Rounds rejected by admission control.", labels=("priority", "reason"))
+)
+ollama_errors = registry.register(
+    Counter("barquiz_ollama_errors_total", "Failed or empty Ollama responses.", labels=("kind",))
+)
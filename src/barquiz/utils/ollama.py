@@ -1,13 +1,25 @@
 import asyncio
 import json
-from time import perf_counter
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from time import monotonic, perf_counter
+from typing import Any, Final
 
+import httpx
 import ollama
 import structlog
-from barquiz.config import settings
+from barquiz.config import GenerationProfile, settings
+from barquiz.utils.json_stream import JsonArrayItemParser
+from barquiz.utils.metrics import llm_latency, llm_load_latency, llm_prompt_eval_latency, ollama_errors
+from barquiz.utils.tracing import span
 
 logger = structlog.get_logger(__name__)
 
+# Загрузка уже прогретой модели занимает миллисекунды; всё, что дольше, считаем холодным стартом.
+COLD_LOAD_THRESHOLD_MS: Final[float] = 500.0
+NS_PER_MS: Final[int] = 1_000_000
+NS_PER_S: Final[int] = 1_000_000_000
+
 # Схема, которую мы просим модель заполнить
 JSON_SCHEMA = """
 {
@@ -20,79 +32,376 @@ JSON_SCHEMA = """
 }
 """
 
-def _query_sync(prompt_text: str) -> tuple[list[dict], float]:
+
+class OllamaOverloadedError(RuntimeError):
+    """Очередь к Ollama переполнена или ожидание слота превысило таймаут."""
+
+
+class OllamaUnavailableError(RuntimeError):
+    """Ollama не ответила или оборвала стриминг ответа."""
+
+
+class InferenceLimiter:
+    """Ограничивает число одновременных инференсов и длину очереди к ним.
+
+    Если очередь уже заполнена или слот не освободился за `OLLAMA_QUEUE_TIMEOUT_S`, запрос сразу
+    получает `OllamaOverloadedError` вместо того, чтобы копиться в ожидании.
     """
-    Синхронный вызов Ollama (блокирующий).
-    Выполняется внутри отдельного потока.
+
+    def __init__(self, max_inflight: int, queue_depth: int, queue_timeout_s: float) -> None:
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._queue_depth = queue_depth
+        self._queue_timeout_s = queue_timeout_s
+        self._waiting = 0
+
+    def ensure_capacity(self) -> None:
+        """Проверяет, что в очереди есть место.
+
+        Raises:
+            OllamaOverloadedError: Очередь к Ollama заполнена.
+        """
+        if self._semaphore.locked() and self._waiting >= self._queue_depth:
+            raise OllamaOverloadedError("Ollama queue is full")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Занимает слот инференса на время блока `async with`.
+
+        Raises:
+            OllamaOverloadedError: Очередь заполнена или слот не освободился вовремя.
+        """
+        self.ensure_capacity()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self._queue_timeout_s)
+        except TimeoutError:
+            raise OllamaOverloadedError("Timed out waiting for a free Ollama slot") from None
+        finally:
+            self._waiting -= 1
+
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+_client: ollama.AsyncClient | None = None
+_keep_warm_task: asyncio.Task[None] | None = None
+_last_used_at = 0.0
+_limiter = InferenceLimiter(
+    max_inflight=settings.OLLAMA_MAX_INFLIGHT,
+    queue_depth=settings.OLLAMA_QUEUE_DEPTH,
+    queue_timeout_s=settings.OLLAMA_QUEUE_TIMEOUT_S,
+)
+
+
+def _get_client() -> ollama.AsyncClient:
+    global _client
+    if _client is None:
+        _client = ollama.AsyncClient(
+            host=settings.OLLAMA_HOST,
+            timeout=settings.OLLAMA_TIMEOUT_S,
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def start_ollama_client() -> None:
+    """Создаёт общий асинхронный клиент Ollama с keep-alive соединениями."""
+    _get_client()
+    logger.info("ollama.client.started", host=settings.OLLAMA_HOST, max_inflight=settings.OLLAMA_MAX_INFLIGHT)
+
+
+async def close_ollama_client() -> None:
+    """Закрывает общий клиент Ollama и его пул соединений."""
+    global _client
+    if _client is None:
+        return
+
+    await _client.close()
+    _client = None
+    logger.info("ollama.client.closed")
+
+
+async def warm_up_model(reason: str = "startup") -> float | None:
+    """Загружает модель профиля по умолчанию в память Ollama и закрепляет её на `OLLAMA_KEEP_ALIVE`.
+
+    Окно контекста передаётся то же, что и в профиле: иначе Ollama перезагрузит модель на первом запросе.
+
+    Args:
+        reason: Причина прогрева для логов и метрик (`startup` или `keep_warm`).
+
+    Returns:
+        Время загрузки модели в мс или None, если Ollama недоступна.
     """
+    global _last_used_at
+    profile = settings.generation_profile()
     started = perf_counter()
-    full_prompt = f"""
-    {prompt_text}
-    
-    IMPORTANT: Output MUST be a valid JSON strictly following this schema:
-    {JSON_SCHEMA}
-    Do not add any markdown formatting or explanations. Just the JSON.
+    try:
+        response = await _get_client().generate(
+            model=profile.model,
+            options={"num_ctx": profile.num_ctx},
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+        )
+    except (ollama.ResponseError, ConnectionError, httpx.HTTPError) as e:
+        ollama_errors.inc(kind="warmup")
+        logger.warning("ollama.warmup.error", error=str(e), model=profile.model, reason=reason)
+        return None
+
+    _last_used_at = monotonic()
+    load_ms = (response.get("load_duration") or 0) / NS_PER_MS
+    llm_load_latency.observe_ms(load_ms, reason=reason)
+    logger.info(
+        "ollama.warmup.completed",
+        model=profile.model,
+        reason=reason,
+        load_ms=load_ms,
+        latency_ms=(perf_counter() - started) * 1000,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
+    )
+    return load_ms
+
+
+async def start_keep_warm() -> None:
+    """Прогревает модель в фоне и, если задан интервал, периодически пингует её в простое."""
+    global _keep_warm_task
+    if not settings.OLLAMA_WARMUP_ENABLED or _keep_warm_task:
+        return
+
+    _keep_warm_task = asyncio.create_task(_keep_warm(), name="ollama-keep-warm")
+
+
+async def stop_keep_warm() -> None:
+    """Останавливает фоновый прогрев модели."""
+    global _keep_warm_task
+    if not _keep_warm_task:
+        return
+
+    _keep_warm_task.cancel()
+    try:
+        await _keep_warm_task
+    except asyncio.CancelledError:
+        pass
+    _keep_warm_task = None
+
+
+async def _keep_warm() -> None:
+    attempted_at = monotonic()
+    await warm_up_model("startup")
+    interval_s = settings.OLLAMA_KEEP_WARM_INTERVAL_S
+    if interval_s <= 0:
+        return
+
+    while True:
+        # Неудачный прогрев не сдвигает _last_used_at, поэтому пауза отсчитывается и от последней попытки:
+        # иначе при недоступной Ollama цикл долбит её без остановки.
+        await asyncio.sleep(max(interval_s - (monotonic() - max(_last_used_at, attempted_at)), 0.0))
+        # Пингуем только в простое: любой настоящий запрос и так продлевает keep_alive.
+        if monotonic() - _last_used_at >= interval_s:
+            attempted_at = monotonic()
+            await warm_up_model("keep_warm")
+
+
+def _observe_inference(response: Any, elapsed_ms: float, mode: str) -> bool:
+    """Записывает латентность инференса с разбивкой на холодный и тёплый старт.
+
+    Returns:
+        True, если Ollama загружала модель перед ответом.
     """
+    global _last_used_at
+    _last_used_at = monotonic()
+    load_ms = (response.get("load_duration") or 0) / NS_PER_MS
+    cold = load_ms >= COLD_LOAD_THRESHOLD_MS
+    if cold:
+        llm_load_latency.observe_ms(load_ms, reason="inference")
+    llm_latency.observe_ms(elapsed_ms, mode=mode, start="cold" if cold else "warm")
+    if response.get("prompt_eval_duration"):
+        llm_prompt_eval_latency.observe_ms(response["prompt_eval_duration"] / NS_PER_MS, mode=mode)
+    return cold
+
+
+def _token_usage(response: Any) -> dict[str, float | int | None]:
+    eval_count = response.get("eval_count")
+    eval_duration_ns = response.get("eval_duration")
+    return {
+        "prompt_tokens": response.get("prompt_eval_count"),
+        "prompt_eval_ms": (response.get("prompt_eval_duration") or 0) / NS_PER_MS,
+        "completion_tokens": eval_count,
+        "eval_rate_tps": eval_count * NS_PER_S / eval_duration_ns if eval_count and eval_duration_ns else None,
+    }
 
+
+def _generation_options(profile: GenerationProfile) -> dict[str, Any]:
+    return {
+        "temperature": profile.temperature,
+        "num_predict": profile.num_predict,
+        "num_ctx": profile.num_ctx,
+    }
+
+
+JSON_INSTRUCTIONS = f"""
+IMPORTANT: Output MUST be a valid JSON strictly following this schema:
+{JSON_SCHEMA}
+Do not add any markdown formatting or explanations. Just the JSON.
+""".strip()
+
+
+def _build_messages(prompt_text: str, system_prompt: str | None) -> list[dict[str, str]]:
+    # Неизменная часть (системный промпт и схема) идёт первой, чтобы Ollama переиспользовала KV-кэш
+    # этого префикса и считала prompt eval только для короткого сообщения пользователя.
+    system = f"{system_prompt}\n\n{JSON_INSTRUCTIONS}" if system_prompt else JSON_INSTRUCTIONS
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt_text},
+    ]
+
+
+def _parse_items(content: str) -> list[dict] | None:
     try:
-        response = ollama.chat(
-            model=settings.OLLAMA_MODEL,
-            messages=[{
-                'role': 'user',
-                'content': full_prompt
-            }],
-            format='json',  # Включаем JSON-режим
-            options={
-                'temperature': 0.8,
-                'num_predict': 2000,
-            },
-            host=settings.OLLAMA_HOST,
-        )
-        
-        content = response['message']['content']
         parsed = json.loads(content)
+    except json.JSONDecodeError:
+        return None
+
+    if isinstance(parsed, dict) and isinstance(parsed.get("data"), list):
+        return parsed["data"]
+    if isinstance(parsed, list):
+        # Иногда модель возвращает сразу список без ключа data
+        return parsed
+    return None
+
+
+async def query_llm(
+    prompt_text: str,
+    profile: GenerationProfile | None = None,
+    system_prompt: str | None = None,
+) -> tuple[list[dict], float]:
+    """Запрашивает у Ollama вопросы в JSON-режиме через общий асинхронный клиент.
+
+    Args:
+        prompt_text: Переменная часть промпта (сообщение пользователя).
+        profile: Профиль генерации; None — профиль по умолчанию.
+        system_prompt: Неизменные инструкции; отправляются системным сообщением перед схемой JSON.
 
-        elapsed_ms = (perf_counter() - started) * 1000
-        
-        # Проверяем, что структура правильная
-        if "data" in parsed and isinstance(parsed["data"], list):
-            logger.info(
-                "ollama.response.completed",
-                model=settings.OLLAMA_MODEL,
-                inference_latency_ms=elapsed_ms,
-                items=len(parsed["data"]),
-            )
-            return parsed["data"], elapsed_ms
-        elif isinstance(parsed, list):
-            # Иногда модель возвращает сразу список без ключа data
-            logger.info(
-                "ollama.response.completed",
-                model=settings.OLLAMA_MODEL,
-                inference_latency_ms=elapsed_ms,
-                items=len(parsed),
-            )
-            return parsed, elapsed_ms
+    Returns:
+        Список элементов `data` (пустой при ошибке) и время инференса в мс.
 
+    Raises:
+        OllamaOverloadedError: Очередь к Ollama переполнена.
+    """
+    profile = profile or settings.generation_profile()
+    async with _limiter.slot():
+        with span("query_llm", model=profile.model, num_ctx=profile.num_ctx):
+            started = perf_counter()
+            try:
+                response = await _get_client().chat(
+                    model=profile.model,
+                    messages=_build_messages(prompt_text, system_prompt),
+                    format='json',  # Включаем JSON-режим
+                    options=_generation_options(profile),
+                    keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                )
+            except (ollama.ResponseError, ConnectionError, httpx.HTTPError) as e:
+                elapsed_ms = (perf_counter() - started) * 1000
+                ollama_errors.inc(kind="response")
+                logger.warning(
+                    "ollama.response.error",
+                    error=str(e),
+                    model=profile.model,
+                    inference_latency_ms=elapsed_ms,
+                )
+                return [], elapsed_ms
+
+    elapsed_ms = (perf_counter() - started) * 1000
+    cold_start = _observe_inference(response, elapsed_ms, mode="json")
+    items = _parse_items(response['message']['content'])
+    if not items:
+        ollama_errors.inc(kind="empty")
         logger.warning(
             "ollama.response.empty",
-            model=settings.OLLAMA_MODEL,
+            model=profile.model,
             inference_latency_ms=elapsed_ms,
+            **_token_usage(response),
         )
         return [], elapsed_ms
 
-    except Exception as e:
-        elapsed_ms = (perf_counter() - started) * 1000
-        logger.warning(
-            "ollama.response.error",
-            error=str(e),
-            model=settings.OLLAMA_MODEL,
-            inference_latency_ms=elapsed_ms,
-        )
-        return [], elapsed_ms
+    logger.info(
+        "ollama.response.completed",
+        model=profile.model,
+        inference_latency_ms=elapsed_ms,
+        cold_start=cold_start,
+        items=len(items),
+        **_token_usage(response),
+    )
+    return items, elapsed_ms
 
-async def query_llm(prompt_text: str) -> tuple[list[dict], float]:
-    """
-    Асинхронная обертка.
+
+async def stream_llm(
+    prompt_text: str,
+    profile: GenerationProfile | None = None,
+    system_prompt: str | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """Стримит ответ Ollama и отдаёт элементы `data` по мере того, как модель их дописывает.
+
+    Args:
+        prompt_text: Переменная часть промпта (сообщение пользователя).
+        profile: Профиль генерации; None — профиль по умолчанию.
+        system_prompt: Неизменные инструкции; отправляются системным сообщением перед схемой JSON.
+
+    Yields:
+        Словари вопросов в том виде, в каком их вернула модель.
+
+    Raises:
+        OllamaOverloadedError: Очередь к Ollama переполнена.
+        OllamaUnavailableError: Ollama недоступна или оборвала ответ; уже отданные элементы остаются у
+            потребителя.
     """
-    # Запускаем синхронную функцию в отдельном потоке
-    return await asyncio.to_thread(_query_sync, prompt_text)
+    parser = JsonArrayItemParser()
+    items_count = 0
+    first_item_ms: float | None = None
+    final_part: Any = {}
+    profile = profile or settings.generation_profile()
+
+    async with _limiter.slot():
+        with span("query_llm", activate=False, model=profile.model, num_ctx=profile.num_ctx, streamed=True):
+            started = perf_counter()
+            try:
+                stream = await _get_client().chat(
+                    model=profile.model,
+                    messages=_build_messages(prompt_text, system_prompt),
+                    format="json",
+                    options=_generation_options(profile),
+                    keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                    stream=True,
+                )
+                async for part in stream:
+                    if part.get("done"):
+                        final_part = part
+                    for item in parser.feed(part["message"]["content"]):
+                        if first_item_ms is None:
+                            first_item_ms = (perf_counter() - started) * 1000
+                        items_count += 1
+                        yield item
+            except (ollama.ResponseError, ConnectionError, httpx.HTTPError) as e:
+                ollama_errors.inc(kind="stream")
+                logger.warning(
+                    "ollama.stream.error",
+                    error=str(e),
+                    model=profile.model,
+                    inference_latency_ms=(perf_counter() - started) * 1000,
+                )
+                raise OllamaUnavailableError(str(e)) from e
+
+    elapsed_ms = (perf_counter() - started) * 1000
+    cold_start = _observe_inference(final_part, elapsed_ms, mode="stream")
+    logger.info(
+        "ollama.stream.completed",
+        model=profile.model,
+        inference_latency_ms=elapsed_ms,
+        cold_start=cold_start,
+        first_item_latency_ms=first_item_ms,
+        items=items_count,
+        **_token_usage(final_part),
+    )
@@ -0,0 +1,142 @@
+import hashlib
+from contextlib import closing
+from dataclasses import dataclass
+from time import time
+from typing import Final
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.utils.extractors import ExtractedPage
+from barquiz.utils.sqlite_store import SQLiteStore
+
+logger = structlog.get_logger(__name__)
+
+SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS page_cache (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    text TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+@dataclass(slots=True)
+class CachedPage:
+    """Извлечённая страница вместе с валидаторами для условного запроса."""
+
+    page: ExtractedPage
+    digest: str
+    etag: str | None
+    last_modified: str | None
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Возвращает заголовки `If-None-Match`/`If-Modified-Since` для перепроверки страницы."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def page_digest(html: str) -> str:
+    """Считает отпечаток HTML, по которому видно, что страница не изменилась и без валидаторов."""
+    return hashlib.blake2b(html.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+
+
+class PageCache:
+    """Персистентный кэш извлечённого текста страниц в SQLite с LRU-вытеснением по суммарному размеру.
+
+    Недоступный файл кэша не ломает загрузку: чтение считается промахом, и страница качается без кэша,
+    а запись пропускается.
+    """
+
+    def __init__(self, store: SQLiteStore, max_bytes: int) -> None:
+        self._store = store
+        self._max_bytes = max_bytes
+
+    async def get(self, url: str) -> CachedPage | None:
+        """Возвращает запись по URL.
+
+        Args:
+            url: Адрес страницы.
+
+        Returns:
+            Извлечённая страница с валидаторами или None, если страницы нет в кэше или кэш недоступен.
+        """
+        return await self._store.run(self._get_sync, url, default=None)
+
+    async def put(
+        self,
+        url: str,
+        page: ExtractedPage,
+        digest: str,
+        etag: str | None,
+        last_modified: str | None,
+    ) -> None:
+        """Сохраняет страницу и вытесняет самые давно использованные записи сверх лимита размера.
+
+        Args:
+            url: Адрес страницы.
+            page: Извлечённые заголовок и текст.
+            digest: Отпечаток HTML из `page_digest`.
+            etag: Заголовок `ETag` ответа.
+            last_modified: Заголовок `Last-Modified` ответа.
+        """
+        await self._store.run(self._put_sync, url, page, digest, etag, last_modified, default=None)
+
+    def _get_sync(self, url: str) -> CachedPage | None:
+        with closing(self._store.connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT title, text, digest, etag, last_modified FROM page_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE page_cache SET accessed_at = ? WHERE url = ?", (time(), url))
+
+        title, text, digest, etag, last_modified = row
+        return CachedPage(
+            page=ExtractedPage(title=title, text=text),
+            digest=digest,
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def _put_sync(
+        self,
+        url: str,
+        page: ExtractedPage,
+        digest: str,
+        etag: str | None,
+        last_modified: str | None,
+    ) -> None:
+        size = len(page.text.encode()) + len((page.title or "").encode())
+        with closing(self._store.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO page_cache "
+                "(url, title, text, digest, etag, last_modified, size, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, page.title, page.text, digest, etag, last_modified, size, time()),
+            )
+            evicted = connection.execute(
+                "DELETE FROM page_cache WHERE url IN ("
+                "SELECT url FROM (SELECT url, SUM(size) OVER (ORDER BY accessed_at DESC) AS total FROM page_cache) "
+                "WHERE total > ?)",
+                (self._max_bytes,),
+            ).rowcount
+
+        if evicted:
+            logger.info("page_cache.evicted", entries=evicted)
+
+
+page_cache = PageCache(
+    SQLiteStore("page_cache", settings.cache_path(settings.PAGE_CACHE_PATH), schema=(SCHEMA,)),
+    max_bytes=settings.PAGE_CACHE_MAX_BYTES,
+)
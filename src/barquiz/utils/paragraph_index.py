@@ -0,0 +1,149 @@
+import hashlib
+import math
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Final
+
+import structlog
+
+from barquiz.config import settings
+from barquiz.utils.context_packing import STEM_LENGTH
+from barquiz.utils.extractors import MIN_PARAGRAPH_LENGTH, extract_terms
+from barquiz.utils.sqlite_store import SQLiteStore
+
+logger = structlog.get_logger(__name__)
+
+SCHEMA: Final[tuple[str, ...]] = (
+    """
+    CREATE TABLE IF NOT EXISTS paragraphs (
+        id INTEGER PRIMARY KEY,
+        digest TEXT NOT NULL UNIQUE,
+        url TEXT NOT NULL,
+        text TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS paragraphs_fts USING fts5(
+        text,
+        content='paragraphs',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS paragraphs_added AFTER INSERT ON paragraphs BEGIN
+        INSERT INTO paragraphs_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS paragraphs_removed AFTER DELETE ON paragraphs BEGIN
+        INSERT INTO paragraphs_fts (paragraphs_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+)
+# Сколько лучших по BM25 абзацев проверяется на покрытие темы.
+SEARCH_CANDIDATES: Final[int] = 200
+
+
+@dataclass(slots=True)
+class IndexedContext:
+    """Абзацы из локального индекса, подходящие под тему, и страницы, с которых они взяты."""
+
+    paragraphs: list[str]
+    urls: list[str]
+
+
+class ParagraphIndex:
+    """Полнотекстовый индекс SQLite FTS5 по всем абзацам, когда-либо извлечённым из страниц.
+
+    Абзацы добавляются по мере загрузки страниц без дублей (по отпечатку текста); сверх
+    `INDEX_MAX_PARAGRAPHS` вытесняются самые старые. Поиск ранжирует абзацы по BM25 на префиксах слов
+    темы, так что «коктейли» находят «коктейлей». Недоступный индекс не ломает пайплайн: поиск считается
+    промахом и тема собирается из сети, а абзацы загруженной страницы просто не добавляются.
+    """
+
+    def __init__(self, store: SQLiteStore) -> None:
+        self._store = store
+
+    async def add(self, url: str, text: str) -> None:
+        """Добавляет в индекс абзацы извлечённого текста страницы.
+
+        Args:
+            url: Адрес страницы.
+            text: Извлечённый текст, абзацы разделены переводами строк.
+        """
+        paragraphs = [line.strip() for line in text.splitlines() if len(line.strip()) >= MIN_PARAGRAPH_LENGTH]
+        if paragraphs:
+            await self._store.run(self._add_sync, url, paragraphs, default=None)
+
+    async def search(self, topic: str, max_chars: int) -> IndexedContext | None:
+        """Ищет абзацы, покрывающие не меньше `INDEX_MIN_TERM_COVERAGE` слов темы.
+
+        Args:
+            topic: Тема запроса.
+            max_chars: Сколько символов абзацев собрать.
+
+        Returns:
+            Лучшие по BM25 абзацы или None, если их меньше `INDEX_MIN_PARAGRAPHS` или индекс недоступен.
+        """
+        stems = {_query_stem(term) for term in extract_terms(topic)}
+        if not stems:
+            return None
+        return await self._store.run(self._search_sync, stems, max_chars, default=None)
+
+    def _add_sync(self, url: str, paragraphs: list[str]) -> None:
+        rows = [(hashlib.blake2b(text.encode(), digest_size=16).hexdigest(), url, text) for text in paragraphs]
+        with closing(self._store.connect()) as connection, connection:
+            added = connection.executemany(
+                "INSERT OR IGNORE INTO paragraphs (digest, url, text) VALUES (?, ?, ?)",
+                rows,
+            ).rowcount
+            evicted = connection.execute(
+                "DELETE FROM paragraphs WHERE id <= (SELECT MAX(id) FROM paragraphs) - ?",
+                (settings.INDEX_MAX_PARAGRAPHS,),
+            ).rowcount
+
+        if evicted:
+            logger.info("paragraph_index.evicted", paragraphs=evicted)
+        logger.debug("paragraph_index.added", url=url, paragraphs=added)
+
+    def _search_sync(self, stems: set[str], max_chars: int) -> IndexedContext | None:
+        query = " OR ".join(f'"{stem}"*' for stem in sorted(stems))
+        with closing(self._store.connect()) as connection:
+            rows = connection.execute(
+                "SELECT paragraphs.url, paragraphs.text FROM paragraphs_fts "
+                "JOIN paragraphs ON paragraphs.id = paragraphs_fts.rowid "
+                "WHERE paragraphs_fts MATCH ? ORDER BY bm25(paragraphs_fts) LIMIT ?",
+                (query, SEARCH_CANDIDATES),
+            ).fetchall()
+
+        required = max(1, math.ceil(len(stems) * settings.INDEX_MIN_TERM_COVERAGE))
+        relevant = [(url, text) for url, text in rows if _covered_stems(text, stems) >= required]
+        if len(relevant) < settings.INDEX_MIN_PARAGRAPHS:
+            return None
+
+        context = IndexedContext(paragraphs=[], urls=[])
+        length = 0
+        for url, text in relevant:
+            if length >= max_chars:
+                break
+            context.paragraphs.append(text)
+            length += len(text) + 1
+            if url not in context.urls:
+                context.urls.append(url)
+        return context
+
+
+def _query_stem(term: str) -> str:
+    # Отрезаем хотя бы последнюю букву, чтобы «агава» находила «агавы», а «пиво» — «пива».
+    return term[: max(3, min(STEM_LENGTH, len(term) - 1))]
+
+
+def _covered_stems(text: str, stems: set[str]) -> int:
+    terms = extract_terms(text)
+    return sum(any(term.startswith(stem) for term in terms) for stem in stems)
+
+
+paragraph_index = ParagraphIndex(
+    SQLiteStore("paragraph_index", settings.cache_path(settings.INDEX_PATH), schema=SCHEMA)
+)
@@ -1,16 +1,22 @@
 import asyncio
-from typing import Final
-from urllib.parse import urlparse
+import threading
+from collections.abc import AsyncIterator, Callable
+from typing import Final, TypeAlias
 from time import perf_counter
 
 from ddgs import DDGS
 
 from barquiz.config import settings
+from barquiz.utils.host_health import host_health, host_key
+from barquiz.utils.metrics import search_latency
+from barquiz.utils.tracing import span
 
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+UrlCallback: TypeAlias = Callable[[str], None]
+
 DDG_REGION: Final[str] = "ru-ru"
 DDG_TIMELIMIT: Final[str] = "y"
 
@@ -67,16 +73,8 @@ SNIPPET_WHITELIST: Final[tuple[str, ...]] = (
 )
 
 
-def _normalize_host(url: str) -> str:
-    parsed = urlparse(url)
-    hostname = (parsed.hostname or "").lower()
-    if hostname.startswith("www."):
-        return hostname[4:]
-    return hostname
-
-
 def _is_allowed_domain(url: str) -> bool:
-    host = _normalize_host(url)
+    host = host_key(url)
     for domain in EXCLUDED_DOMAINS:
         if host == domain or host.endswith(f".{domain}"):
             return False
@@ -114,7 +112,11 @@ def _snippet_is_relevant(snippet: str | None) -> bool:
 
 
 def _perform_ddg_request(query: str, enforce_snippet: bool) -> list[str]:
-    """Выполняет запрос к DuckDuckGo используя настройки по умолчанию."""
+    """Выполняет запрос к DuckDuckGo используя настройки по умолчанию.
+
+    Хосты, отключённые трекером здоровья, отбрасываются, а медленные и часто ошибающиеся уступают
+    место следующим результатам выдачи.
+    """
     urls: list[str] = []
     seen: set[str] = set()
 
@@ -136,7 +138,7 @@ def _perform_ddg_request(query: str, enforce_snippet: bool) -> list[str]:
                     continue
 
                 href = result.get("href")
-                if not href or href in seen or not _is_allowed_domain(href):
+                if not href or href in seen or not _is_allowed_domain(href) or not host_health.is_usable(href):
                     continue
 
                 snippet = result.get("body")
@@ -146,28 +148,112 @@ def _perform_ddg_request(query: str, enforce_snippet: bool) -> list[str]:
                 urls.append(href)
                 seen.add(href)
 
-                if len(urls) >= settings.SEARCH_LIMIT:
-                    break
-
     except Exception as error:  # noqa: BLE001
         logger.warning("ddg.search.failed", error=str(error), query=query)
         return []
 
+    return host_health.rank(urls)[: settings.SEARCH_LIMIT]
+
+
+async def _search_variants(query: str, on_url: UrlCallback | None = None) -> list[str]:
+    """Параллельно опрашивает DuckDuckGo всеми вариантами запроса и режимами фильтрации сниппетов.
+
+    Не больше `SEARCH_CONCURRENCY` запросов идут одновременно. Побеждает первый вариант, вернувший
+    хотя бы `SEARCH_MIN_URLS` адресов. Варианты, которые к этому моменту ещё не начали запрос, в
+    DuckDuckGo уже не ходят; уже отправленные запросы прервать нельзя, их результат отбрасывается.
+    С `SEARCH_MERGE_VARIANTS` результаты вариантов сливаются без дублей, пока не наберётся
+    `SEARCH_LIMIT` адресов. Если ни один вариант не набрал минимум, возвращается всё, что нашлось.
+
+    Args:
+        query: Текст поискового запроса.
+        on_url: Колбэк, который получает каждый принятый URL сразу после победы варианта.
+
+    Returns:
+        Список URL без дублей, не длиннее `SEARCH_LIMIT`.
+    """
+    # Отмена задачи asyncio.to_thread не останавливает её поток, поэтому и лимит, и флаг завершения
+    # проверяются в самом потоке: проигравший вариант, дождавшись слота, увидит флаг и не пойдёт в сеть.
+    slots = threading.Semaphore(settings.SEARCH_CONCURRENCY)
+    finished = threading.Event()
+    attempts = [
+        asyncio.create_task(_run_variant(slots, finished, query_variant, enforce_snippet))
+        for enforce_snippet in (True, False)
+        for query_variant in _build_queries(query)
+    ]
+    target = settings.SEARCH_LIMIT if settings.SEARCH_MERGE_VARIANTS else settings.SEARCH_MIN_URLS
+
+    merged: list[str] = []
+    leftovers: list[str] = []
+    try:
+        for attempt in asyncio.as_completed(attempts):
+            urls = await attempt
+            if settings.SEARCH_MERGE_VARIANTS or len(urls) >= settings.SEARCH_MIN_URLS:
+                _merge_urls(merged, urls, on_url)
+            else:
+                leftovers.extend(urls)
+
+            if len(merged) >= target:
+                break
+    finally:
+        finished.set()
+        for attempt in attempts:
+            attempt.cancel()
+
+    if not merged:
+        _merge_urls(merged, leftovers, on_url)
+    return merged
+
+
+async def _run_variant(
+    slots: threading.Semaphore,
+    finished: threading.Event,
+    query_variant: str,
+    enforce_snippet: bool,
+) -> list[str]:
+    urls, latency_ms = await asyncio.to_thread(
+        _perform_limited_request,
+        slots,
+        finished,
+        query_variant,
+        enforce_snippet,
+    )
+    logger.debug(
+        "ddg.search.variant_completed",
+        query=query_variant,
+        enforce_snippet=enforce_snippet,
+        urls_found=len(urls),
+        latency_ms=latency_ms,
+    )
     return urls
 
 
-def _search_sync(query: str) -> list[str]:
-    """Выполняет поиск DuckDuckGo синхронно с фильтрацией доменов и сниппетов."""
-    query_variants = _build_queries(query)
+def _perform_limited_request(
+    slots: threading.Semaphore,
+    finished: threading.Event,
+    query_variant: str,
+    enforce_snippet: bool,
+) -> tuple[list[str], float]:
+    with slots:
+        if finished.is_set():
+            return [], 0.0
+        started = perf_counter()
+        urls = _perform_ddg_request(query_variant, enforce_snippet)
+        if not settings.SEARCH_MERGE_VARIANTS and len(urls) >= settings.SEARCH_MIN_URLS:
+            # Флаг ставится до освобождения слота: ждущий вариант должен увидеть победу раньше event loop.
+            finished.set()
+    return urls, (perf_counter() - started) * 1000
+
 
-    for enforce_snippet in (True, False):
-        for query_variant in query_variants:
-            # Больше нет цикла по бэкендам, вызываем напрямую
-            urls = _perform_ddg_request(query_variant, enforce_snippet)
-            if urls:
-                return urls
+def _merge_urls(merged: list[str], urls: list[str], on_url: UrlCallback | None) -> None:
+    for url in urls:
+        if len(merged) >= settings.SEARCH_LIMIT:
+            return
+        if url in merged:
+            continue
 
-    return []
+        merged.append(url)
+        if on_url:
+            on_url(url)
 
 
 async def search_ddg(query: str) -> tuple[list[str], float]:
@@ -181,11 +267,76 @@ async def search_ddg(query: str) -> tuple[list[str], float]:
     """
     started = perf_counter()
     try:
-        urls = await asyncio.wait_for(asyncio.to_thread(_search_sync, query), timeout=5)
+        with span("search_ddg", query=query):
+            urls = await asyncio.wait_for(_search_variants(query), timeout=settings.SEARCH_TIMEOUT_S)
     except asyncio.TimeoutError:
         elapsed_ms = (perf_counter() - started) * 1000
-        logger.warning("ddg.search.timeout", query=query, timeout_s=5, elapsed_ms=elapsed_ms)
+        logger.warning("ddg.search.timeout", query=query, timeout_s=settings.SEARCH_TIMEOUT_S, elapsed_ms=elapsed_ms)
+        search_latency.observe_ms(elapsed_ms)
         raise
     elapsed_ms = (perf_counter() - started) * 1000
+    search_latency.observe_ms(elapsed_ms)
     logger.info("ddg.search.completed", query=query, urls_found=len(urls), network_latency_search_ms=elapsed_ms)
     return urls, elapsed_ms
+
+
+class SearchStream:
+    """Асинхронный поток URL из DuckDuckGo для конвейера «качаем, пока ищем».
+
+    URL отдаются потребителю по мере того, как побеждают варианты запроса в `_search_variants`. После завершения
+    (или досрочной остановки) итерации в `urls` лежат отданные URL, а в `latency_ms` — время поиска.
+    """
+
+    def __init__(self, query: str) -> None:
+        self.query = query
+        self.urls: list[str] = []
+        self.latency_ms = 0.0
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[str | None] = asyncio.Queue()
+        search = asyncio.create_task(_search_variants(self.query, queue.put_nowait))
+        search.add_done_callback(lambda _: queue.put_nowait(None))
+
+        started = perf_counter()
+        deadline = loop.time() + settings.SEARCH_TIMEOUT_S
+        with span("search_ddg", activate=False, query=self.query, streamed=True) as search_span:
+            try:
+                while True:
+                    try:
+                        url = await asyncio.wait_for(queue.get(), timeout=max(deadline - loop.time(), 0))
+                    except TimeoutError:
+                        self._log_timeout(started)
+                        if not self.urls:
+                            raise
+                        break
+
+                    if url is None:
+                        break
+                    self.urls.append(url)
+                    yield url
+            finally:
+                search.cancel()
+                self.latency_ms = (perf_counter() - started) * 1000
+                search_latency.observe_ms(self.latency_ms)
+                search_span.set(urls_found=len(self.urls))
+                logger.info(
+                    "ddg.search.completed",
+                    query=self.query,
+                    urls_found=len(self.urls),
+                    network_latency_search_ms=self.latency_ms,
+                    streamed=True,
+                )
+
+    def _log_timeout(self, started: float) -> None:
+        elapsed_ms = (perf_counter() - started) * 1000
+        logger.warning(
+            "ddg.search.timeout",
+            query=self.query,
+            timeout_s=settings.SEARCH_TIMEOUT_S,
+            elapsed_ms=elapsed_ms,
+            urls_found=len(self.urls),
+        )
@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+from collections.abc import Callable
+from pathlib import Path
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+class SQLiteStore:
+    """Файл SQLite, каталог и схема которого создаются при первом подключении.
+
+    Все обращения к SQLite выполняются в отдельном потоке, чтобы не блокировать event loop. Поверх него
+    лежат кэши и индексы, без которых пайплайн работает, поэтому ошибки SQLite и файловой системы (нет прав
+    на каталог, диск переполнен, файл повреждён) не пробрасываются: операция возвращает значение
+    по умолчанию, а ошибка логируется один раз, пока хранилище снова не заработает.
+    """
+
+    def __init__(self, name: str, path: Path, schema: tuple[str, ...]) -> None:
+        self._name = name
+        self._path = path
+        self._schema = schema
+        self._initialized = False
+        self._failing = False
+
+    def connect(self) -> sqlite3.Connection:
+        """Открывает соединение; при первом обращении создаёт каталог и схему.
+
+        Raises:
+            sqlite3.Error: Файл не открывается или схема не создаётся.
+            OSError: Каталог не создаётся.
+        """
+        if not self._initialized:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self._path)
+        if self._initialized:
+            return connection
+
+        try:
+            with connection:
+                for statement in self._schema:
+                    connection.execute(statement)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        self._initialized = True
+        return connection
+
+    async def run[T](self, operation: Callable[..., T], *args: object, default: T) -> T:
+        """Выполняет синхронную операцию над хранилищем в отдельном потоке.
+
+        Args:
+            operation: Функция, которая работает с соединением из `connect`.
+            *args: Аргументы операции.
+            default: Что вернуть, если SQLite или файловая система недоступны.
+
+        Returns:
+            Результат операции или `default`.
+        """
+        try:
+            result = await asyncio.to_thread(operation, *args)
+        except (sqlite3.Error, OSError) as error:
+            if not self._failing:
+                logger.warning("sqlite.unavailable", store=self._name, path=str(self._path), error=str(error))
+            self._failing = True
+            return default
+
+        if self._failing:
+            logger.info("sqlite.recovered", store=self._name, path=str(self._path))
+            self._failing = False
+        return result
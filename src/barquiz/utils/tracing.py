@@ -0,0 +1,171 @@
+import asyncio
+import json
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from enum import StrEnum
+from pathlib import Path
+from time import perf_counter, time
+from typing import TypeAlias
+from uuid import uuid4
+
+import structlog
+from structlog.contextvars import get_contextvars
+
+from barquiz.config import settings
+
+logger = structlog.get_logger(__name__)
+
+AttributeValue: TypeAlias = str | int | float | bool | None
+
+
+class SpanStatus(StrEnum):
+    OK = "ok"
+    ERROR = "error"
+    CANCELLED = "cancelled"
+
+
+@dataclass(slots=True)
+class Span:
+    """Один замер стадии пайплайна внутри трассы запроса."""
+
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    started_at: float
+    duration_ms: float = 0.0
+    status: SpanStatus = SpanStatus.OK
+    attributes: dict[str, AttributeValue] = field(default_factory=dict)
+
+    def set(self, **attributes: AttributeValue) -> None:
+        """Добавляет атрибуты к спану."""
+        self.attributes.update(attributes)
+
+
+class SpanRecorder:
+    """Кольцевой буфер завершённых спанов с опциональной записью в JSONL-файл."""
+
+    def __init__(self, capacity: int, path: Path | None) -> None:
+        self._spans: deque[Span] = deque(maxlen=capacity)
+        self._path = path
+
+    def record(self, span: Span) -> None:
+        """Сохраняет завершённый спан."""
+        self._spans.append(span)
+        if self._path is None:
+            return
+
+        try:
+            with self._path.open("a", encoding="utf-8") as file:
+                file.write(json.dumps(asdict(span), ensure_ascii=False) + "\n")
+        except OSError as error:
+            logger.warning("trace.write_failed", path=str(self._path), error=str(error))
+
+    def recent_traces(self, limit: int) -> list[list[Span]]:
+        """Возвращает спаны последних `limit` трасс, от новых к старым.
+
+        Args:
+            limit: Сколько трасс вернуть.
+
+        Returns:
+            Список трасс, каждая — спаны в порядке старта.
+        """
+        traces: dict[str, list[Span]] = {}
+        for span in reversed(self._spans):
+            if span.trace_id not in traces and len(traces) >= limit:
+                continue
+            traces.setdefault(span.trace_id, []).append(span)
+        return [sorted(spans, key=lambda span: span.started_at) for spans in traces.values()]
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+recorder = SpanRecorder(
+    capacity=settings.TRACE_BUFFER_SIZE,
+    path=Path(settings.TRACE_FILE) if settings.TRACE_FILE else None,
+)
+
+
+def start_span(name: str, **attributes: AttributeValue) -> Span:
+    """Открывает дочерний спан текущего, не делая его текущим и не записывая.
+
+    Для стадий, которые заканчиваются позже, чем выходит создавший их код (например, запрос со
+    стриминговым телом): спан делается текущим через `activate_span` и записывается `finish_span`.
+
+    Корневой спан получает `trace_id`, равный `request_id` из контекста structlog, чтобы трассу
+    можно было сопоставить с логами.
+
+    Args:
+        name: Имя стадии.
+        **attributes: Начальные атрибуты спана.
+
+    Returns:
+        Открытый спан.
+    """
+    parent = _current_span.get()
+    return Span(
+        trace_id=parent.trace_id if parent else str(get_contextvars().get("request_id") or uuid4()),
+        span_id=uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        name=name,
+        started_at=time(),
+        attributes=dict(attributes),
+    )
+
+
+@contextmanager
+def activate_span(current: Span) -> Iterator[Span]:
+    """Делает спан текущим для вложенных вызовов на время блока, не завершая его."""
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+
+
+def finish_span(current: Span, duration_ms: float) -> None:
+    """Завершает спан из `start_span` и записывает его.
+
+    Args:
+        current: Спан.
+        duration_ms: Длительность стадии.
+    """
+    current.duration_ms = duration_ms
+    if settings.TRACE_ENABLED:
+        recorder.record(current)
+
+
+@contextmanager
+def span(name: str, activate: bool = True, **attributes: AttributeValue) -> Iterator[Span]:
+    """Замеряет стадию и записывает её как дочерний спан текущего.
+
+    Args:
+        name: Имя стадии.
+        activate: Делать ли спан текущим для вложенных вызовов. Внутри асинхронных генераторов
+            передавайте False, иначе спан «протечёт» к потребителю между `yield`.
+        **attributes: Начальные атрибуты спана.
+
+    Yields:
+        Спан, в который можно дописать атрибуты.
+    """
+    current = start_span(name, **attributes)
+    if not settings.TRACE_ENABLED:
+        yield current
+        return
+
+    token = _current_span.set(current) if activate else None
+    started = perf_counter()
+    try:
+        yield current
+    except asyncio.CancelledError:
+        current.status = SpanStatus.CANCELLED
+        raise
+    except Exception:
+        current.status = SpanStatus.ERROR
+        raise
+    finally:
+        if token is not None:
+            _current_span.reset(token)
+        finish_span(current, (perf_counter() - started) * 1000)
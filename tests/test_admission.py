@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from barquiz.core.admission import AdmissionController, AdmissionRejectedError, Priority
+
+
+def _controller(queue_size: int = 4, deadline_s: float = 60.0, round_s: float = 1.0) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=1, queue_size=queue_size, deadline_s=deadline_s, expected_round_s=round_s
+    )
+
+
+async def _hold(
+    controller: AdmissionController,
+    priority: Priority,
+    release: asyncio.Event,
+    order: list[str],
+    name: str,
+) -> None:
+    async with controller.slot(priority):
+        order.append(name)
+        await release.wait()
+
+
+def test_interactive_rounds_are_served_before_background() -> None:
+    async def scenario() -> list[str]:
+        controller = _controller()
+        order: list[str] = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, Priority.INTERACTIVE, release, order, "running"))]
+        await asyncio.sleep(0)
+        for name, priority in [
+            ("background-1", Priority.BACKGROUND),
+            ("interactive", Priority.INTERACTIVE),
+            ("background-2", Priority.BACKGROUND),
+        ]:
+            tasks.append(asyncio.create_task(_hold(controller, priority, release, order, name)))
+            await asyncio.sleep(0)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["running", "interactive", "background-1", "background-2"]
+
+
+def test_interactive_round_evicts_latest_background_from_full_queue() -> None:
+    async def scenario() -> None:
+        controller = _controller(queue_size=2)
+        order: list[str] = []
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, Priority.BACKGROUND, release, order, "running"))
+        await asyncio.sleep(0)
+        early = asyncio.create_task(_hold(controller, Priority.BACKGROUND, release, order, "early"))
+        late = asyncio.create_task(_hold(controller, Priority.BACKGROUND, release, order, "late"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(_hold(controller, Priority.INTERACTIVE, release, order, "interactive"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError):
+            await late
+        release.set()
+        await asyncio.gather(running, early, interactive)
+        assert order == ["running", "interactive", "early"]
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_without_background_rounds_rejects_with_retry_after() -> None:
+    async def scenario() -> None:
+        controller = _controller(queue_size=1, round_s=4.0)
+        release = asyncio.Event()
+        tasks = [
+            asyncio.create_task(_hold(controller, Priority.INTERACTIVE, release, [], name))
+            for name in ("running", "queued")
+        ]
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            controller.ensure_capacity(Priority.INTERACTIVE)
+        # Впереди один ожидающий, плюс сам раунд: две «волны» по 4 с на одном слоте.
+        assert rejected.value.retry_after_s == 8.0
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+
+def test_interactive_round_that_misses_deadline_is_rejected_upfront() -> None:
+    async def scenario() -> None:
+        controller = _controller(deadline_s=5.0, round_s=3.0)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, Priority.BACKGROUND, release, [], "running"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            async with controller.slot(Priority.INTERACTIVE):
+                pass
+        assert rejected.value.retry_after_s == 3.0
+        # У фоновых раундов дедлайна нет, они просто встают в очередь.
+        controller.ensure_capacity(Priority.BACKGROUND)
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+
+def test_idle_controller_admits_immediately_and_retries_after_one_second() -> None:
+    controller = _controller()
+
+    controller.ensure_capacity(Priority.INTERACTIVE)
+    assert controller.retry_after_s() == 1.0
@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException, Request, Response
+
+from barquiz import api
+from barquiz.config import settings
+from barquiz.core import generator
+from barquiz.core.admission import AdmissionRejectedError, admission
+from barquiz.core.generator import RoundPrompt
+from barquiz.core.pool import round_pool
+from barquiz.models import QuestionItem
+from barquiz.utils import ollama
+from barquiz.utils.ollama import OllamaOverloadedError
+from barquiz.utils.metrics import registry
+
+
+class _UnreachableClient:
+    async def chat(self, **_: object) -> object:
+        raise ConnectionError("Ollama is down")
+
+
+async def _prepared_round(topic: str | None, profile_name: str | None) -> RoundPrompt:
+    return RoundPrompt(
+        topic=topic or "ром",
+        vibe="дружелюбный",
+        profile=settings.generation_profile(),
+        profile_name=settings.GENERATION_PROFILE,
+        prompt="Тема: ром",
+        gather_result=None,
+        network_timings={},
+    )
+
+
+def _get(path: str, **params: str) -> httpx.Response:
+    async def request() -> httpx.Response:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, params=params)
+
+    return asyncio.run(request())
+
+
+def _post(path: str, payload: dict[str, object]) -> httpx.Response:
+    async def request() -> httpx.Response:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=payload)
+
+    return asyncio.run(request())
+
+
+def _saturate_admission(monkeypatch: pytest.MonkeyPatch) -> None:
+    def reject(*_: object) -> None:
+        raise AdmissionRejectedError("Admission queue is full", retry_after_s=2.5)
+
+    monkeypatch.setattr(admission, "ensure_capacity", reject)
+
+
+def test_stream_ends_with_error_line_when_ollama_is_down(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(generator, "_prepare_round", _prepared_round)
+    monkeypatch.setattr(ollama, "_client", _UnreachableClient())
+
+    response = _get("/questions/stream", topic="ром без пула")
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"error": "failed", "detail": "Question generator is unavailable"},
+    ]
+
+
+def test_stream_serves_pooled_round_while_admission_is_saturated(monkeypatch: pytest.MonkeyPatch) -> None:
+    _saturate_admission(monkeypatch)
+    pooled = [QuestionItem(title="Из чего делают ром?", value="Из сахарного тростника")]
+    monkeypatch.setattr(round_pool, "take_ready", lambda topic, profile: pooled)
+
+    response = _get("/questions/stream", topic="ром")
+
+    assert response.status_code == 200
+    assert [QuestionItem.model_validate_json(line) for line in response.text.splitlines()] == pooled
+
+
+def test_stream_rejects_live_generation_while_admission_is_saturated(monkeypatch: pytest.MonkeyPatch) -> None:
+    _saturate_admission(monkeypatch)
+    monkeypatch.setattr(round_pool, "take_ready", lambda topic, profile: None)
+
+    response = _get("/questions/stream", topic="ром")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+
+
+def test_middleware_records_latency_of_http_exceptions() -> None:
+    request = Request({"type": "http", "method": "GET", "path": "/teapot", "headers": [], "query_string": b""})
+
+    async def call_next(_: Request) -> Response:
+        raise HTTPException(status_code=418)
+
+    async def scenario() -> None:
+        with pytest.raises(HTTPException):
+            await api.request_context(request, call_next)
+
+    asyncio.run(scenario())
+
+    assert 'barquiz_request_duration_seconds_count{path="unmatched",status="418"} 1' in registry.render()
+
+
+def test_rounds_reports_overload_with_retry_after(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def overloaded(*_: object) -> tuple[list[dict], float]:
+        raise OllamaOverloadedError("Ollama queue is full")
+
+    monkeypatch.setattr(generator, "_prepare_round", _prepared_round)
+    monkeypatch.setattr(generator, "query_llm", overloaded)
+
+    response = _post("/rounds", {"topics": ["ром пакетом", "джин пакетом"]})
+
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+
+
+def test_rounds_rejects_topics_together_with_count() -> None:
+    response = _post("/rounds", {"topics": ["ром"], "count": 3})
+
+    assert response.status_code == 422
@@ -0,0 +1,51 @@
+from barquiz.utils.context_packing import estimate_tokens, pack_context
+
+RUM = "Ром выдерживают в дубовых бочках, и от выдержки зависит цвет и вкус готового напитка."
+GIN = "Джин настаивают на можжевельнике, кориандре и цедре, а потом перегоняют ещё раз."
+WINE = "Вино из винограда пино нуар требует прохладного климата и аккуратной выдержки."
+
+
+def _long_paragraph(last_word: str) -> str:
+    words = [f"слово{index}" for index in range(80)]
+    return " ".join([*words, last_word])
+
+
+def test_exact_and_near_duplicates_are_dropped() -> None:
+    text = "\n".join([RUM, _long_paragraph("конец"), GIN, RUM, _long_paragraph("финал")])
+
+    packed = pack_context(text, "ром", max_tokens=10_000)
+
+    assert packed.paragraphs == 5
+    assert packed.duplicates == 2
+    assert packed.text.splitlines() == [RUM, _long_paragraph("конец"), GIN]
+
+
+def test_budget_keeps_most_relevant_paragraphs_in_original_order() -> None:
+    text = "\n".join([WINE, GIN, RUM])
+    budget = estimate_tokens(GIN) + estimate_tokens(RUM) + 2
+
+    packed = pack_context(text, "джин и ром", max_tokens=budget)
+
+    assert packed.text.splitlines() == [GIN, RUM]
+    assert packed.packed == 2
+    assert packed.estimated_tokens <= budget
+
+
+def test_topic_matches_by_word_stem() -> None:
+    packed = pack_context("\n".join([WINE, RUM]), "дубовая бочка", max_tokens=estimate_tokens(RUM) + 1)
+
+    assert packed.text == RUM
+
+
+def test_short_lines_are_not_counted_as_paragraphs() -> None:
+    packed = pack_context("Меню\nКоротко о роме\n" + RUM, "ром", max_tokens=10_000)
+
+    assert packed.paragraphs == 1
+    assert packed.text == RUM
+
+
+def test_empty_budget_packs_nothing() -> None:
+    packed = pack_context(RUM, "ром", max_tokens=0)
+
+    assert packed.text == ""
+    assert packed.packed == 0
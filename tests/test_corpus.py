@@ -0,0 +1,50 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from barquiz.models import DataGatheringResult
+from barquiz.utils import corpus
+from barquiz.utils.corpus import get_corpus, write_corpus
+
+
+def _result(topic: str) -> DataGatheringResult:
+    text = f"Контекст про {topic}"
+    return DataGatheringResult(
+        topic=topic, urls=["https://example.com"], text=text, text_length=len(text), text_preview=text
+    )
+
+
+@pytest.fixture(autouse=True)
+def _fresh_corpus(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(corpus, "_corpus", None)
+    monkeypatch.setattr(corpus, "_corpus_stamp", None)
+
+
+def test_corpus_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "topics.bqc"
+    entries = {f"тема {index}": _result(f"тема {index}") for index in range(50)}
+
+    write_corpus(path, entries)
+    opened = get_corpus(path)
+
+    assert opened is not None
+    assert len(opened) == 50
+    assert all(opened.get(key) == result for key, result in entries.items())
+    assert opened.get("нет такой темы") is None
+
+
+def test_snapshot_built_after_first_lookup_is_picked_up(tmp_path: Path) -> None:
+    path = tmp_path / "topics.bqc"
+    assert get_corpus(path) is None
+
+    write_corpus(path, {"ром": _result("ром")})
+    assert get_corpus(path).get("ром") == _result("ром")
+
+    write_corpus(path, {"джин": _result("джин")})
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    rebuilt = get_corpus(path)
+
+    assert rebuilt.get("джин") == _result("джин")
+    assert rebuilt.get("ром") is None
@@ -0,0 +1,31 @@
+import pytest
+
+from barquiz.utils.extractors import Extractor, extract_with_bs4, extract_with_lxml
+
+PARAGRAPH = "Бланко пьют с солью и лаймом, а репосадо пробуют медленно."
+
+
+@pytest.mark.parametrize("extract", [extract_with_bs4, extract_with_lxml])
+@pytest.mark.parametrize(
+    ("head", "title"),
+    [
+        ("<title> Заметки <b>бармена</b>:  текила</title>", "Заметки бармена: текила"),
+        ("<title>Ром &amp; кола</title>", "Ром & кола"),
+        ("<title>   </title>", None),
+        ("", None),
+    ],
+)
+def test_backends_extract_same_title(extract: Extractor, head: str, title: str | None) -> None:
+    page = extract(f"<html><head>{head}</head><body><p>{PARAGRAPH}</p></body></html>")
+
+    assert page.title == title
+    assert page.text == PARAGRAPH
+
+
+def test_lxml_parses_xhtml_with_xml_declaration() -> None:
+    html = (
+        '<?xml version="1.0" encoding="windows-1251"?>'
+        f"<html><head><title>Бар</title></head><body><p>{PARAGRAPH}</p></body></html>"
+    )
+
+    assert extract_with_lxml(html) == extract_with_bs4(html)
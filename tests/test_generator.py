@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from barquiz.core import generator
+from barquiz.models import DataGatheringResult
+
+
+def test_gather_after_last_waiter_cancelled_starts_new_flight(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = 0
+    result = DataGatheringResult(
+        topic="ром", urls=["https://example.com"], text="текст", text_length=5, text_preview="текст"
+    )
+
+    async def fake_gather_context(topic: str, gather_span: object) -> tuple[DataGatheringResult | None, dict]:
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            return result, {}
+        try:
+            await asyncio.Event().wait()
+        finally:
+            # Отменённый сбор завершается не сразу, как и настоящий при закрытии соединений.
+            await asyncio.sleep(0.05)
+        return None, {}
+
+    monkeypatch.setattr(generator, "_gather_context", fake_gather_context)
+
+    async def scenario() -> tuple[DataGatheringResult | None, dict[str, float]]:
+        first = asyncio.create_task(generator.gather_quiz_context("Ром"))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await generator.gather_quiz_context("ром")
+
+    assert asyncio.run(scenario()) == (result, {})
+    assert calls == 2
+    assert not generator._gather_flights
+
+
+RESULT = DataGatheringResult(
+    topic="ром", urls=["https://example.com"], text="текст", text_length=5, text_preview="текст"
+)
+
+
+class _FakeGather:
+    """Подменяет сбор контекста: ждёт сигнала `release` и запоминает, сколько раз его запускали и отменяли."""
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, topic: str, gather_span: object) -> tuple[DataGatheringResult | None, dict]:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return RESULT, {}
+
+
+def test_concurrent_gathers_share_one_flight(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeGather()
+    monkeypatch.setattr(generator, "_gather_context", fake)
+
+    async def scenario() -> list[tuple[DataGatheringResult | None, dict[str, float]]]:
+        waiters = [asyncio.create_task(generator.gather_quiz_context(topic)) for topic in ("ром", "Ром", " ром ")]
+        await asyncio.sleep(0)
+        fake.release.set()
+        async with asyncio.timeout(1):
+            return await asyncio.gather(*waiters)
+
+    assert asyncio.run(scenario()) == [(RESULT, {})] * 3
+    assert fake.calls == 1
+    assert not generator._gather_flights
+
+
+def test_cancelled_waiter_does_not_cancel_shared_flight(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeGather()
+    monkeypatch.setattr(generator, "_gather_context", fake)
+
+    async def scenario() -> tuple[DataGatheringResult | None, dict[str, float]]:
+        leaving = asyncio.create_task(generator.gather_quiz_context("ром"))
+        staying = asyncio.create_task(generator.gather_quiz_context("ром"))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        fake.release.set()
+        async with asyncio.timeout(1):
+            return await staying
+
+    assert asyncio.run(scenario()) == (RESULT, {})
+    assert fake.calls == 1
+    assert fake.cancelled == 0
+
+
+def test_flight_is_cancelled_when_all_waiters_leave(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeGather()
+    monkeypatch.setattr(generator, "_gather_context", fake)
+
+    async def scenario() -> int:
+        waiters = [asyncio.create_task(generator.gather_quiz_context("ром")) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        # Даём отменённому сбору доработать; проверяем до выхода из asyncio.run, который сам отменит задачи.
+        await asyncio.sleep(0)
+        return fake.cancelled
+
+    assert asyncio.run(scenario()) == 1
+    assert fake.calls == 1
+    assert not generator._gather_flights
@@ -0,0 +1,135 @@
+import pytest
+
+from barquiz.config import settings
+from barquiz.utils import host_health as host_health_module
+from barquiz.utils.host_health import CircuitState, HostHealthTracker
+
+URL = "https://www.bar.example/page"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(host_health_module, "monotonic", clock)
+    monkeypatch.setattr(settings, "HOST_HEALTH_ENABLED", True)
+    monkeypatch.setattr(settings, "HOST_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "HOST_COOLDOWN_S", 10.0)
+    monkeypatch.setattr(settings, "HOST_BLOCKLIST_AFTER_TRIPS", 3)
+    monkeypatch.setattr(settings, "HOST_BLOCKLIST_TTL_S", 100.0)
+    return clock
+
+
+def _fail(tracker: HostHealthTracker, times: int = 1) -> None:
+    for _ in range(times):
+        tracker.record_failure(URL, 100.0, reason="timeout")
+
+
+def test_breaker_opens_after_consecutive_failures(clock: _Clock) -> None:
+    tracker = HostHealthTracker()
+
+    _fail(tracker, 2)
+    assert tracker.state(URL) is CircuitState.CLOSED
+    assert tracker.try_acquire(URL)
+
+    _fail(tracker)
+    assert tracker.state(URL) is CircuitState.OPEN
+    assert not tracker.try_acquire(URL)
+    assert not tracker.is_usable(URL)
+
+
+def test_success_resets_consecutive_failures(clock: _Clock) -> None:
+    tracker = HostHealthTracker()
+
+    _fail(tracker, 2)
+    tracker.record_success(URL, 100.0)
+    _fail(tracker, 2)
+
+    assert tracker.state(URL) is CircuitState.CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock: _Clock) -> None:
+    tracker = HostHealthTracker()
+    _fail(tracker, 3)
+
+    clock.now += 10.0
+    assert tracker.state(URL) is CircuitState.HALF_OPEN
+    assert tracker.is_usable(URL)
+    assert tracker.try_acquire(URL)
+    assert not tracker.try_acquire("https://bar.example/other")
+
+    tracker.record_success(URL, 100.0)
+    assert tracker.state(URL) is CircuitState.CLOSED
+    assert tracker.try_acquire(URL)
+
+
+def test_failed_probe_reopens_with_doubled_cooldown(clock: _Clock) -> None:
+    tracker = HostHealthTracker()
+    _fail(tracker, 3)
+    clock.now += 10.0
+    assert tracker.try_acquire(URL)
+
+    _fail(tracker)
+    assert tracker.state(URL) is CircuitState.OPEN
+    clock.now += 10.0
+    assert tracker.state(URL) is CircuitState.OPEN
+    clock.now += 10.0
+    assert tracker.state(URL) is CircuitState.HALF_OPEN
+
+
+def test_host_is_blocklisted_after_repeated_trips(clock: _Clock) -> None:
+    tracker = HostHealthTracker()
+    _fail(tracker, 3)
+    for cooldown_s in (10.0, 20.0):
+        clock.now += cooldown_s
+        _fail(tracker)
+
+    assert tracker.state(URL) is CircuitState.BLOCKED
+    clock.now += 99.0
+    assert not tracker.is_usable(URL)
+    clock.now += 1.0
+    assert tracker.state(URL) is CircuitState.HALF_OPEN
+
+
+@pytest.mark.parametrize(("status_code", "failed"), [(200, False), (404, False), (429, True), (503, True)])
+def test_response_status_decides_failure(clock: _Clock, status_code: int, failed: bool) -> None:
+    tracker = HostHealthTracker()
+
+    for _ in range(3):
+        tracker.record_response(URL, status_code, 100.0)
+
+    assert (tracker.state(URL) is CircuitState.OPEN) is failed
+
+
+def test_rank_moves_slow_and_failing_hosts_to_the_end(clock: _Clock) -> None:
+    tracker = HostHealthTracker()
+    tracker.record_success("https://slow.example/a", settings.HOST_SLOW_MS * 2)
+    for _ in range(4):
+        # Доля ошибок сглажена, поэтому выше HOST_DEGRADED_ERROR_RATE она поднимается не с первой неудачи.
+        tracker.record_failure("https://flaky.example/a", 100.0, reason="500")
+    tracker.record_success("https://fast.example/a", 100.0)
+    urls = ["https://slow.example/b", "https://flaky.example/b", "https://fast.example/b", "https://new.example/b"]
+
+    assert tracker.rank(urls) == [
+        "https://fast.example/b",
+        "https://new.example/b",
+        "https://slow.example/b",
+        "https://flaky.example/b",
+    ]
+
+
+def test_disabled_tracker_never_blocks(clock: _Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "HOST_HEALTH_ENABLED", False)
+    tracker = HostHealthTracker()
+
+    _fail(tracker, 10)
+
+    assert tracker.try_acquire(URL)
+    assert tracker.is_usable(URL)
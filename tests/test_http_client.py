@@ -0,0 +1,107 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+
+from barquiz.config import settings
+from barquiz.utils import http_client
+from barquiz.utils.http_client import FetchedPage, PageResult, fetch_urls
+from barquiz.utils.host_health import HostHealthTracker
+
+
+class _FakePages:
+    """Подменяет загрузку страницы: у каждого URL своя задержка, текст — сам URL."""
+
+    def __init__(self, delays: dict[str, float]) -> None:
+        self.delays = delays
+        self.started: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def __call__(self, client: object, url: str, topic: str) -> PageResult:
+        self.started.append(url)
+        try:
+            await asyncio.sleep(self.delays[url])
+        except asyncio.CancelledError:
+            self.cancelled.append(url)
+            raise
+        return FetchedPage(url=url, status_code=200, html=url), url, 0.0
+
+
+@pytest.fixture
+def tracker(monkeypatch: pytest.MonkeyPatch) -> HostHealthTracker:
+    tracker = HostHealthTracker()
+    monkeypatch.setattr(http_client, "host_health", tracker)
+    monkeypatch.setattr(http_client, "_get_client", lambda: None)
+    monkeypatch.setattr(settings, "HOST_HEALTH_ENABLED", True)
+    monkeypatch.setattr(settings, "FETCH_BUDGET_S", 5.0)
+    monkeypatch.setattr(settings, "FETCH_HEDGE_DELAY_S", 5.0)
+    return tracker
+
+
+def _fake_pages(monkeypatch: pytest.MonkeyPatch, delays: dict[str, float]) -> _FakePages:
+    pages = _FakePages(delays)
+    monkeypatch.setattr(http_client, "_fetch_and_extract", pages)
+    return pages
+
+
+def test_quorum_limits_parallel_fetches(monkeypatch: pytest.MonkeyPatch, tracker: HostHealthTracker) -> None:
+    urls = [f"https://site{index}.example/" for index in range(4)]
+    pages = _fake_pages(monkeypatch, dict.fromkeys(urls, 0.01))
+
+    text, _ = asyncio.run(fetch_urls(urls, "ром", quorum=2))
+
+    assert pages.started == urls[:2]
+    assert sorted(text.split("\n\n")) == urls[:2]
+
+
+def test_lagging_fetch_is_hedged_by_spare_url(monkeypatch: pytest.MonkeyPatch, tracker: HostHealthTracker) -> None:
+    monkeypatch.setattr(settings, "FETCH_HEDGE_DELAY_S", 0.05)
+    slow, fast = "https://slow.example/", "https://fast.example/"
+    pages = _fake_pages(monkeypatch, {slow: 10.0, fast: 0.01})
+
+    text, elapsed_ms = asyncio.run(fetch_urls([slow, fast], "ром", quorum=1))
+
+    # Отстающая загрузка уступила слот запасному URL и была отменена, когда тот набрал кворум.
+    assert text == fast
+    assert pages.started == [slow, fast]
+    assert pages.cancelled == [slow]
+    assert elapsed_ms < 1000
+
+
+def test_budget_cancels_unfinished_fetches(monkeypatch: pytest.MonkeyPatch, tracker: HostHealthTracker) -> None:
+    monkeypatch.setattr(settings, "FETCH_BUDGET_S", 0.05)
+    urls = ["https://a.example/", "https://b.example/"]
+    pages = _fake_pages(monkeypatch, dict.fromkeys(urls, 10.0))
+
+    text, elapsed_ms = asyncio.run(fetch_urls(urls, "ром"))
+
+    assert text == ""
+    assert sorted(pages.cancelled) == urls
+    assert elapsed_ms < 1000
+
+
+def test_target_chars_stops_collection(monkeypatch: pytest.MonkeyPatch, tracker: HostHealthTracker) -> None:
+    urls = ["https://a.example/", "https://b.example/", "https://c.example/"]
+    delays = {urls[0]: 0.01, urls[1]: 0.02, urls[2]: 10.0}
+    pages = _fake_pages(monkeypatch, delays)
+
+    text, _ = asyncio.run(fetch_urls(urls, "ром", target_chars=len(urls[0])))
+
+    assert text == urls[0]
+    assert pages.cancelled == urls[1:]
+
+
+def test_open_circuit_hosts_are_skipped(monkeypatch: pytest.MonkeyPatch, tracker: HostHealthTracker) -> None:
+    monkeypatch.setattr(settings, "HOST_FAILURE_THRESHOLD", 1)
+    broken, healthy = "https://broken.example/", "https://healthy.example/"
+    tracker.record_failure(broken, 100.0, reason="timeout")
+    pages = _fake_pages(monkeypatch, {broken: 0.01, healthy: 0.01})
+
+    async def stream() -> AsyncIterator[str]:
+        for url in (broken, healthy):
+            yield url
+
+    text, _ = asyncio.run(fetch_urls(stream(), "ром"))
+
+    assert text == healthy
+    assert pages.started == [healthy]
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from barquiz.utils.json_stream import JsonArrayItemParser
+
+ITEMS = [
+    {"title": "Что такое \"мохито\"?", "value": "Коктейль с ромом, лаймом и мятой"},
+    {"title": "Скобки { и ] в тексте", "value": "Не ломают разбор \\ ни капли"},
+    {"title": "Вложенный объект", "value": "Да", "meta": {"tags": [{"name": "ром"}], "level": 2}},
+]
+
+
+def _feed_all(parser: JsonArrayItemParser, chunks: list[str]) -> list[dict]:
+    return [item for chunk in chunks for item in parser.feed(chunk)]
+
+
+@pytest.mark.parametrize("document", [{"data": ITEMS}, ITEMS], ids=["data", "bare-list"])
+def test_parser_yields_each_item_once_for_any_split(document: object) -> None:
+    text = json.dumps(document, ensure_ascii=False)
+
+    for size in (1, 2, 3, 7, len(text)):
+        chunks = [text[index : index + size] for index in range(0, len(text), size)]
+        assert _feed_all(JsonArrayItemParser(), chunks) == ITEMS
+
+
+def test_parser_yields_item_as_soon_as_it_closes() -> None:
+    parser = JsonArrayItemParser()
+
+    assert parser.feed('{"data": [{"title": "a", "value": "b"}, {"title": "c"') == [{"title": "a", "value": "b"}]
+    assert parser.feed(', "value": "d"}]}') == [{"title": "c", "value": "d"}]
+
+
+def test_parser_splits_inside_escape_sequence() -> None:
+    parser = JsonArrayItemParser()
+
+    assert parser.feed('[{"title": "кавычка \\') == []
+    assert parser.feed('" внутри", "value": "}"}]') == [{"title": 'кавычка " внутри', "value": "}"}]
+
+
+def test_parser_skips_broken_items_and_non_objects() -> None:
+    parser = JsonArrayItemParser()
+
+    items = parser.feed(
+        '{"data": [1, "два", {"title": "ok", "value": "v"}, {"title": oops}, {"title": "x", "value": "y"}]}'
+    )
+
+    assert items == [{"title": "ok", "value": "v"}, {"title": "x", "value": "y"}]
+
+
+def test_parser_ignores_objects_outside_arrays() -> None:
+    assert JsonArrayItemParser().feed('{"title": "не в массиве", "value": "нет"}') == []
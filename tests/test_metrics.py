@@ -0,0 +1,35 @@
+import pytest
+
+from barquiz.utils.metrics import Counter, Histogram, Metric
+
+
+def test_metric_without_samples_cannot_be_created() -> None:
+    class Incomplete(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("barquiz_incomplete", "Metric without samples.")
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("barquiz_test_seconds", "Test histogram.", labels=("path",), buckets=(0.1, 1.0))
+    histogram.observe_ms(50, path="/a")
+    histogram.observe_ms(500, path="/a")
+    histogram.observe_ms(5000, path="/a")
+
+    assert histogram.render() == [
+        "# HELP barquiz_test_seconds Test histogram.",
+        "# TYPE barquiz_test_seconds histogram",
+        'barquiz_test_seconds_bucket{path="/a",le="0.1"} 1',
+        'barquiz_test_seconds_bucket{path="/a",le="1"} 2',
+        'barquiz_test_seconds_bucket{path="/a",le="+Inf"} 3',
+        'barquiz_test_seconds_sum{path="/a"} 5.55',
+        'barquiz_test_seconds_count{path="/a"} 3',
+    ]
+
+
+def test_counter_rejects_unknown_labels() -> None:
+    counter = Counter("barquiz_test_total", "Test counter.", labels=("result",))
+
+    with pytest.raises(ValueError):
+        counter.inc(kind="hit")
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from barquiz.config import settings
+from barquiz.utils import ollama
+
+
+class _UnreachableClient:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def generate(self, **_: object) -> dict[str, object]:
+        self.calls += 1
+        raise ConnectionError("Ollama is down")
+
+
+def test_keep_warm_waits_interval_after_failed_warmup(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = _UnreachableClient()
+    monkeypatch.setattr(ollama, "_client", client)
+    monkeypatch.setattr(ollama, "_last_used_at", 0.0)
+    monkeypatch.setattr(settings, "OLLAMA_KEEP_WARM_INTERVAL_S", 0.1)
+
+    async def scenario() -> None:
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(ollama._keep_warm(), timeout=0.35)
+
+    asyncio.run(scenario())
+
+    # Старт и по попытке на каждый интервал, а не сотни попыток подряд.
+    assert 3 <= client.calls <= 5